@@ -0,0 +1,194 @@
+import argparse
+import json
+import os
+import shlex
+import sys
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+import misc.modes as modes
+from gui.video_capture import VideoCapture
+from tools.adaptive_sampler import AdaptiveSampler
+from tools.analyse import Analyser
+from tools.object_detection.object_detector import ObjectDetector, WEIGHTS_PATH
+from tools.parameters import Parameters
+
+MODES = {
+    "default": modes.DEFAULT_MODE,
+    "fast": modes.FAST_MODE,
+    "changing_light": modes.CHANGING_LIGHT_MODE
+}
+
+DEFAULT_SIZES = ["320x240", "640x480", "1280x720", "1920x1080"]
+GENERATED_FPS = 25
+
+MARKDOWN_BEGIN = "<!-- benchmark results begin -->"
+MARKDOWN_END = "<!-- benchmark results end -->"
+
+
+def generate_clip(directory, width, height, seconds):
+    # static noisy background with a few objects passing through, similar to a typical recording
+    path = os.path.join(directory, "generated_{}x{}.avi".format(width, height))
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), GENERATED_FPS, (width, height), True)
+    random_generator = np.random.default_rng(0)
+    background = (random_generator.random((height, width, 3)) * 60 + 80).astype(np.uint8)
+
+    frames_number = seconds * GENERATED_FPS
+    object_width = width // 8
+    object_height = height // 5
+    for frame_index in range(frames_number):
+        frame = cv2.add(background, (random_generator.random((height, width, 3)) * 6).astype(np.uint8))
+        # object is visible during the second quarter and the last quarter of the clip
+        phase = 4 * frame_index // frames_number
+        if phase in (1, 3):
+            progress = (frame_index % (frames_number // 4)) / (frames_number // 4)
+            x = int(progress * (width - object_width))
+            cv2.rectangle(frame, (x, height // 3), (x + object_width, height // 3 + object_height), (0, 0, 255), -1)
+        writer.write(frame)
+
+    writer.release()
+    return path
+
+
+def run_analysis(video_path, mode, use_detection):
+    parameters = Parameters()
+    parameters.update_from_dict(mode)
+    video_capture = VideoCapture(video_path, parameters)
+    object_detector = ObjectDetector() if use_detection else None
+    analyser = Analyser(parameters, object_detector, show_preview=False)
+
+    starting_point = time.time()
+    # frames are read in the same way as by the console interface, idle parts are skipped by the sampler
+    sampler = AdaptiveSampler(video_capture, analyser, parameters.idle_sampling_interval) \
+        if parameters.adaptive_sampling else None
+    frames = 0
+    ret, frame = sampler.read() if sampler is not None else video_capture.get_frame()
+    while ret:
+        analyser.analyse_frame(frame)
+        frames += 1
+        if sampler is not None:
+            sampler.update()
+            ret, frame = sampler.read()
+        else:
+            ret, frame = video_capture.get_frame()
+
+    analyser.wait_for_detection()
+    if object_detector is not None:
+        object_detector.shutdown()
+    wall_time = time.time() - starting_point
+
+    video_frames = sampler.position if sampler is not None else frames
+    video_length = video_frames / video_capture.get_fps()
+    result = {
+        "video": os.path.basename(video_path),
+        "length": video_length,
+        "fps": video_capture.get_fps(),
+        "source_size": "{:g} x {:g}".format(video_capture.source_width, video_capture.source_height),
+        "analysed_size": "{:g} x {:g}".format(video_capture.width, video_capture.height),
+        # frames larger than the maximal size of analysed video are scaled down
+        "resized": video_capture.resize,
+        "frames": video_frames,
+        "analysed_frames": frames,
+        "detection": use_detection,
+        "wall_time": wall_time,
+        "frames_per_second": frames / wall_time,
+        "real_time_factor": video_length / wall_time
+    }
+    video_capture.release_video()
+    return result
+
+
+def format_length(seconds):
+    return time.strftime("%M:%S", time.gmtime(seconds))
+
+
+def create_markdown_table(results):
+    lines = ["| Video | Length | Fps | Size | Analysed size | Mode | Object detection | Analysis time [s] "
+             "| Frames/s | Real-time factor |",
+             "|:-----:|:------:|:---:|:----:|:-------------:|:----:|:----------------:|:-----------------:"
+             "|:--------:|:----------------:|"]
+    for result in results:
+        lines.append("| {} | {} | {:g} | {} | {} | {} | {} | {:.2f} | {:.1f} | {:.2f} |".format(
+            result["video"], format_length(result["length"]), result["fps"], result["source_size"],
+            result["analysed_size"] + (" (resized)" if result["resized"] else ""), result["mode"], "yes" if result["detection"] else "no", result["wall_time"],
+            result["frames_per_second"], result["real_time_factor"]))
+
+    return "\n".join(lines)
+
+
+def write_markdown(path, table, command):
+    # only the generated section is replaced, hand measurements in the file are kept
+    section = "{}\nGenerated with `{}`.\n\n{}\n{}".format(MARKDOWN_BEGIN, command, table, MARKDOWN_END)
+    content = ""
+    if os.path.exists(path):
+        with open(path) as markdown_file:
+            content = markdown_file.read()
+
+    if MARKDOWN_BEGIN in content and MARKDOWN_END in content:
+        begin = content.index(MARKDOWN_BEGIN)
+        end = content.index(MARKDOWN_END) + len(MARKDOWN_END)
+        content = content[:begin] + section + content[end:]
+    else:
+        content = content.rstrip("\n") + "\n\n## Benchmark suite\n\n" \
+                  + section + "\n"
+
+    with open(path, "w") as markdown_file:
+        markdown_file.write(content)
+
+
+def main():
+    argparser = argparse.ArgumentParser(description="Benchmark of CCTV analyser")
+    argparser.add_argument("-videos", nargs="*", default=["sample.mp4"], help="Video files to analyse")
+    argparser.add_argument("-sizes", nargs="*", default=DEFAULT_SIZES,
+                           help="Sizes of generated clips given as WIDTHxHEIGHT")
+    argparser.add_argument("-seconds", type=int, default=20, help="Length of generated clips in seconds")
+    argparser.add_argument("-modes", nargs="*", default=list(MODES), choices=list(MODES),
+                           help="Analysis modes to measure")
+    argparser.add_argument("-no_detection", action="store_true", help="Measure only analysis without object "
+                                                                      "detection")
+    argparser.add_argument("-json", type=str, default="benchmark.json", help="Output file with results")
+    argparser.add_argument("-markdown", type=str, default="performance.md", help="Markdown file to update")
+    args = argparser.parse_args()
+
+    detection_options = [False]
+    if args.no_detection:
+        pass
+    elif os.path.exists(WEIGHTS_PATH):
+        detection_options.append(True)
+    else:
+        print("YOLO weights not found in {}, object detection is skipped".format(WEIGHTS_PATH))
+
+    results = []
+    with tempfile.TemporaryDirectory() as clips_directory:
+        videos = list(args.videos)
+        for size in args.sizes:
+            width, height = (int(value) for value in size.split("x"))
+            print("Generating {} clip...".format(size))
+            videos.append(generate_clip(clips_directory, width, height, args.seconds))
+
+        for video_path in videos:
+            for mode_name in args.modes:
+                for use_detection in detection_options:
+                    print("Analysing {} in {} mode{}...".format(os.path.basename(video_path), mode_name,
+                                                               " with object detection" if use_detection else ""))
+                    result = run_analysis(video_path, MODES[mode_name], use_detection)
+                    result["mode"] = mode_name
+                    results.append(result)
+
+    environment = {"opencv": cv2.__version__, "numpy": np.__version__, "cpus": os.cpu_count(),
+                   "date": time.strftime("%Y-%m-%d %H:%M:%S")}
+    with open(args.json, "w") as json_file:
+        json.dump({"environment": environment, "results": results}, json_file, indent=4)
+
+    table = create_markdown_table(results)
+    # the exact invocation is saved, so results can be compared with later runs
+    command = " ".join(["python3", "benchmark.py"] + [shlex.quote(argument) for argument in sys.argv[1:]])
+    write_markdown(args.markdown, table, command)
+    print(table)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,11 +1,29 @@
 import argparse
+import os
 import signal
 import time
 
+import misc.defaults as defaults
 from gui.video_capture import VideoCapture
+from tools.adaptive_sampler import AdaptiveSampler
 from tools.analyse import Analyser
+from tools.analysis_index import AnalysisIndex
+from tools.batch_analysis import run_batch
+from tools.checkpoint import can_save_checkpoint, get_checkpoint_state, load_checkpoint, remove_checkpoint, \
+    resume_analysis, save_checkpoint
+from tools.chunked_analysis import analyse_in_chunks
+from tools.instrumentation import metrics
+from tools.live_analysis import LiveSource, parse_source
+from tools.live_capture import LiveCapture, STOP_CHECK_INTERVAL
+from tools.media_info import get_tagged_date
 from tools.object_detection.object_detector import ObjectDetector
 from tools.parameters import Parameters
+from tools.pipeline import AnalysisPipeline
+from tools.results_database import ResultsDatabase
+from tools.shortcut_export import export_shortcut, export_shortcut_in_parallel
+from tools.thumbnails import ThumbnailWriter
+from tools.timeline import get_timeline_path
+from tools.video_writer import VideoWriter
 
 running_analysis = True
 
@@ -22,7 +40,11 @@ def read_parameters_from_file(file_name, parameters):
 
     for parameter_name, value in parameters_values:
         attribute_type = type(getattr(parameters, parameter_name))
-        value = attribute_type(value)
+        # bool("False") is True, so boolean flags need to be compared with their text form
+        if attribute_type is bool:
+            value = value == str(True)
+        else:
+            value = attribute_type(value)
         setattr(parameters, parameter_name, value)
 
 
@@ -49,6 +71,20 @@ def write_parameters_to_file(file_name, parameters):
 
     output_file.write("object_detection_interval {}\n".format(parameters.object_detection_interval))
 
+    output_file.write("use_proxy {}\n".format(parameters.use_proxy))
+    output_file.write("proxy_scale {}\n".format(parameters.proxy_scale))
+
+    output_file.write("adaptive_sampling {}\n".format(parameters.adaptive_sampling))
+    output_file.write("idle_sampling_interval {}\n".format(parameters.idle_sampling_interval))
+
+    output_file.write("detect_motion_regions {}\n".format(parameters.detect_motion_regions))
+    output_file.write("region_padding {}\n".format(parameters.region_padding))
+
+    output_file.write("suppress_duplicates {}\n".format(parameters.suppress_duplicates))
+    output_file.write("duplicate_hash_distance {}\n".format(parameters.duplicate_hash_distance))
+
+    output_file.write("record_timeline {}\n".format(parameters.record_timeline))
+
     output_file.close()
 
 
@@ -73,11 +109,339 @@ def sigint_handler(signum, frame):
     running_analysis = False
 
 
+def print_fragment(fragment, fps):
+    print("Fragment beginning: {}".format(format_time(fragment[0] / fps)))
+    print("Fragment end: {}".format(format_time(fragment[1] / fps)))
+
+
+def report_motion(motion_detected, return_frame_index, already_moving, fps, fragments):
+    if not motion_detected and already_moving:
+        already_moving = False
+        formatted = format_time(return_frame_index / fps)
+        print("Fragment end: {}".format(formatted))
+        fragments[-1][1] = return_frame_index
+    elif motion_detected and not already_moving:
+        already_moving = True
+        formatted = format_time(return_frame_index / fps)
+        print("Fragment beginning: {}".format(formatted))
+        fragments.append([return_frame_index, None])
+
+    return already_moving
+
+
+def save_timeline(timeline, input_name):
+    if timeline is not None and isinstance(input_name, str):
+        timeline_path = get_timeline_path(input_name)
+        timeline.save(timeline_path)
+        print("Motion timeline saved to {}".format(timeline_path))
+
+
+def write_checkpoint(input_name, parameters, analyser_state, fragments, already_moving, timeline):
+    progress = {"fragments": fragments, "already_moving": already_moving}
+    save_checkpoint(input_name, parameters.as_dict(), analyser_state["frame_counter"], analyser_state, progress,
+                    timeline)
+
+
+def resume_from_checkpoint(input_name, video_capture, analyser, checkpoint, warmup_frames, fragments):
+    # returns position of the first frame to analyse and whether a fragment is in progress
+    if checkpoint is None:
+        return 0, False
+
+    position = resume_analysis(input_name, video_capture, analyser, checkpoint, warmup_frames)
+    fragments.extend(checkpoint["progress"]["fragments"])
+    for fragment in fragments:
+        if fragment[1] is not None:
+            print_fragment(fragment, video_capture.get_fps())
+        else:
+            print("Fragment beginning: {}".format(format_time(fragment[0] / video_capture.get_fps())))
+    print("Analysis resumed from {}".format(format_time(position / video_capture.get_fps())))
+    return position, checkpoint["progress"]["already_moving"]
+
+
+def register_video(results_database, input_name, video_capture, parameters, resumed):
+    # every analysis of a file is a separate entry of results, resumed analysis continues the interrupted one
+    video_id = results_database.get_last_video(input_name) if resumed else None
+    if video_id is None:
+        video_id = results_database.add_video(input_name, AnalysisIndex().increment(input_name),
+                                              video_capture.get_fps(), video_capture.get_frames_num(),
+                                              get_tagged_date(input_name), parameters.as_dict())
+    results_database.attach_source(video_id)
+    return video_id
+
+
+def finish_analysis(analyser, already_moving, frame_counter, fps, input_name, fragments):
+    end_analyse_point = time.time()
+    save_timeline(analyser.get_timeline(), input_name)
+    if isinstance(input_name, str):
+        if running_analysis:
+            remove_checkpoint(input_name)
+        else:
+            print("Analysis interrupted, it can be continued with -resume flag")
+
+    print("Waiting for object detection to finish...")
+    analyser.wait_for_detection()
+    if already_moving:
+        formatted = format_time(frame_counter / fps)
+        print("Fragment end: {}".format(formatted))
+        fragments[-1][1] = frame_counter
+
+    return end_analyse_point
+
+
+def run_sequential_analysis(input_name, video_capture, parameters, object_detector, use_device, fragments,
+                            checkpoint=None, warmup_frames=defaults.CHUNK_WARMUP_FRAMES,
+                            latency_budget=defaults.LIVE_LATENCY_BUDGET, thumbnails=None):
+    analyser = Analyser(parameters, object_detector, show_preview=False, thumbnails=thumbnails)
+    position, already_moving = resume_from_checkpoint(input_name, video_capture, analyser, checkpoint, warmup_frames,
+                                                      fragments)
+
+    sampler = None
+    live_capture = None
+    read_frame = video_capture.get_frame
+    if use_device:
+        # camera is read in a separate thread and frames which waited too long are dropped
+        live_capture = LiveCapture(video_capture, True, latency_budget=latency_budget)
+        live_capture.start()
+
+        def read_frame():
+            return live_capture.get_frame(STOP_CHECK_INTERVAL)
+    elif parameters.adaptive_sampling:
+        sampler = AdaptiveSampler(video_capture, analyser, parameters.idle_sampling_interval, position)
+        read_frame = sampler.read
+
+    frame_counter = position + 1
+    next_checkpoint = position + defaults.CHECKPOINT_INTERVAL
+    ret, frame = read_frame()
+    while running_analysis and (ret or use_device):
+        if not ret:
+            # camera has not delivered a new frame yet
+            ret, frame = read_frame()
+            continue
+
+        if live_capture is not None:
+            # dropped frames are counted, so frame indices still correspond to time
+            analyser.set_frame_counter(live_capture.position - 1)
+        analysed_frame, motion_detected, return_frame_index = analyser.analyse_frame(frame)
+        if sampler is not None:
+            sampler.update()
+
+        already_moving = report_motion(motion_detected, return_frame_index, already_moving, video_capture.get_fps(),
+                                       fragments)
+
+        if not use_device and frame_counter >= next_checkpoint and can_save_checkpoint(analyser, sampler):
+            write_checkpoint(input_name, parameters, get_checkpoint_state(analyser), fragments, already_moving,
+                             analyser.get_timeline())
+            next_checkpoint = frame_counter + defaults.CHECKPOINT_INTERVAL
+
+        ret, frame = read_frame()
+        frame_counter = sampler.position + 1 if sampler is not None else frame_counter + 1
+
+    if live_capture is not None:
+        live_capture.stop()
+        frame_counter = live_capture.position + 1
+        print("Frames dropped to keep latency under {} s: {}".format(latency_budget,
+                                                                     live_capture.get_statistics()["dropped_frames"]))
+
+    if not running_analysis and not use_device and can_save_checkpoint(analyser, sampler):
+        write_checkpoint(input_name, parameters, get_checkpoint_state(analyser), fragments, already_moving,
+                         analyser.get_timeline())
+
+    return finish_analysis(analyser, already_moving, frame_counter, video_capture.get_fps(), input_name, fragments)
+
+
+def run_pipelined_analysis(input_name, video_capture, parameters, object_detector, queue_size, fragments,
+                           checkpoint=None, warmup_frames=defaults.CHUNK_WARMUP_FRAMES, thumbnails=None):
+    analyser = Analyser(parameters, object_detector, show_preview=False, thumbnails=thumbnails)
+    position, already_moving = resume_from_checkpoint(input_name, video_capture, analyser, checkpoint, warmup_frames,
+                                                      fragments)
+
+    if parameters.adaptive_sampling:
+        print("Adaptive sampling is not used in pipeline mode")
+
+    def analyse_frame(frame_number, frame):
+        # analysis runs ahead of the main thread, so its state for a checkpoint is taken right after the frame,
+        # after interruption it is taken after every frame
+        analysed_frame, motion_detected, return_frame_index = analyser.analyse_frame(frame)
+        state = get_checkpoint_state(analyser) \
+            if frame_number % defaults.CHECKPOINT_INTERVAL == 0 or not running_analysis else None
+        return analysed_frame, motion_detected, return_frame_index, state
+
+    pipeline = AnalysisPipeline(video_capture.get_frame, analyse_frame, queue_size, position + 1)
+
+    frame_counter = position + 1
+    for frame_counter, (analysed_frame, motion_detected, return_frame_index, state) in pipeline.results():
+        already_moving = report_motion(motion_detected, return_frame_index, already_moving, video_capture.get_fps(),
+                                       fragments)
+        if state is not None:
+            write_checkpoint(input_name, parameters, state, fragments, already_moving, analyser.get_timeline())
+            # results analysed before interruption are still reported, the first state taken after it is saved
+            if not running_analysis:
+                break
+
+    pipeline.stop()
+
+    # a stage with constantly full input queue is slower than the previous one
+    for queue_name, statistics in pipeline.get_statistics().items():
+        print("Queue of {} frames: average depth {:.2f}, max depth {}".format(queue_name, statistics["average"],
+                                                                            statistics["max"]))
+
+    return finish_analysis(analyser, already_moving, frame_counter + 1, video_capture.get_fps(), input_name,
+                           fragments)
+
+
+def run_chunked_analysis(input_name, video_capture, parameters, workers, warmup_frames, fragments):
+    found_fragments, timeline = analyse_in_chunks(input_name, parameters, workers, warmup_frames,
+                                                  lambda: running_analysis)
+    if found_fragments is None:
+        print("Analysis interrupted, chunked analysis has to be started again")
+        return time.time()
+
+    for fragment in found_fragments:
+        print_fragment(fragment, video_capture.get_fps())
+    fragments.extend(found_fragments)
+
+    save_timeline(timeline, input_name)
+
+    return time.time()
+
+
+def report_batch_progress(video_path, entry):
+    if entry["status"] == "completed":
+        print("{}: {} fragments found in {:.2f} s".format(video_path, entry["fragments"], entry["analysis_time"]))
+    else:
+        print("{}: analysis failed ({})".format(video_path, entry["error"]))
+
+
+def run_batch_analysis(patterns, parameters, workers, manifest_path, output_directory):
+    videos_number, skipped_number = run_batch(patterns, parameters, workers, manifest_path, output_directory,
+                                              report_batch_progress, ResultsDatabase(), lambda: running_analysis)
+    if not running_analysis:
+        print("Batch interrupted, files which are not finished are analysed when it is run again")
+    else:
+        print("Batch completed: {} files found, {} already analysed".format(videos_number, skipped_number))
+    print("Manifest saved to {}".format(manifest_path))
+
+
+def report_live_motion(live_source, motion_detected, moment):
+    if motion_detected:
+        print("[{}] Fragment beginning: {}".format(live_source.name, format_time(moment)))
+    else:
+        print("[{}] Fragment end: {}".format(live_source.name, format_time(moment)))
+
+
+def report_live_objects(source_name, fragment_index, objects):
+    print("[{}] Objects found in fragment {}: {}".format(source_name, fragment_index + 1, " ".join(objects)))
+
+
+def report_live_statistics(live_sources):
+    for live_source in live_sources:
+        statistics = live_source.get_statistics()
+        print("[{}] {:.1f} fps (source {:.1f} fps), analysed frames: {}, dropped frames: {}, "
+              "latency: mean {:.3f} s, max {:.3f} s".format(
+                live_source.name, statistics["fps"], statistics["source_fps"], statistics["analysed_frames"],
+                statistics["dropped_frames"], statistics["mean_latency"], statistics["max_latency"]))
+
+
+def run_live_analysis(sources, parameters, object_detector, report_interval, latency_budget):
+    # all sources are analysed at the same time in one process, until all of them end or Ctrl+C is pressed
+    parameters_values = parameters.as_dict()
+    live_sources = []
+    for source_number, source in enumerate(sources):
+        try:
+            live_sources.append(LiveSource(parse_source(source), parameters_values, object_detector,
+                                           report_live_motion, "{}: {}".format(source_number + 1, source),
+                                           latency_budget))
+        except ValueError as e:
+            print(e)
+
+    for live_source in live_sources:
+        live_source.start()
+
+    next_report = time.time() + report_interval
+    while running_analysis and any(live_source.is_running() for live_source in live_sources):
+        time.sleep(0.1)
+        if time.time() >= next_report:
+            report_live_statistics(live_sources)
+            next_report += report_interval
+
+    for live_source in live_sources:
+        live_source.stop()
+        if live_source.get_error() is not None:
+            print("[{}] Analysis failed: {}".format(live_source.name, live_source.get_error()))
+
+    print("Waiting for object detection to finish...")
+    object_detector.wait()
+    report_live_statistics(live_sources)
+
+
+def get_shortcut_path(input_name):
+    return input_name[0: input_name.rfind("."):] + "_shortcut.avi"
+
+
+def save_shortcut(input_name, video_capture, parameters, fragments, output_path, workers):
+    if not output_path:
+        output_path = get_shortcut_path(input_name)
+
+    print("Saving shortcut video...")
+    starting_point = time.time()
+    fragments = [fragment for fragment in fragments if fragment[1] is not None]
+    if workers > 1:
+        written_frames = export_shortcut_in_parallel(input_name, parameters, fragments, output_path, workers)
+    else:
+        video_writer = VideoWriter(video_capture.width, video_capture.height)
+        video_writer.initialize_video_writer(input_name, output_path)
+        written_frames = export_shortcut(video_capture, fragments, video_writer)
+        video_writer.release()
+    print("Shortcut with {} frames saved to {} in {:.2f} s".format(written_frames, output_path,
+                                                                   time.time() - starting_point))
+
+
 def main():
     argparser = argparse.ArgumentParser(description="Console version of CCTV analyser")
     argparser.add_argument("input_video", nargs="?", type=str, help="Path to video file or video device index")
     argparser.add_argument("-dev", action="store_true", help="Given input is device index")
     argparser.add_argument("-param", type=str, help="External file with analysis parameters")
+    argparser.add_argument("-chunks", type=int, help="Split video file into given number of chunks analysed in "
+                                                     "parallel processes (motion analysis only)")
+    argparser.add_argument("-warmup", type=int, default=defaults.CHUNK_WARMUP_FRAMES,
+                           help="Number of frames analysed before each chunk or resumed analysis to let background "
+                                "subtractor converge")
+    argparser.add_argument("-pipeline", type=int, nargs="?", const=defaults.PIPELINE_QUEUE_SIZE,
+                           help="Decode and analyse frames in separate threads connected by queues of given size")
+    argparser.add_argument("-detection_workers", type=int, default=defaults.DETECTION_WORKERS,
+                           help="Number of object detection workers, each of them loads its own network")
+    argparser.add_argument("-detection_processes", action="store_true",
+                           help="Run object detection workers as processes instead of threads")
+    argparser.add_argument("-detection_batch", type=int, default=defaults.DETECTION_BATCH_SIZE,
+                           help="Maximal number of frames passed to the network at once")
+    argparser.add_argument("-metrics", type=str, help="Save durations of analysis stages and counters to given "
+                                                      "JSON file")
+    argparser.add_argument("-shortcut", type=str, nargs="?", const="",
+                           help="Save found fragments to shortcut video (<video>_shortcut.avi by default)")
+    argparser.add_argument("-live", type=str, nargs="+",
+                           help="Analyse given devices (indices) or video files (played in real time) at the same "
+                                "time, with one shared object detector")
+    argparser.add_argument("-report_interval", type=float, default=defaults.LIVE_REPORT_INTERVAL,
+                           help="How often frame rates of live sources are printed, in seconds")
+    argparser.add_argument("-latency", type=float, default=defaults.LIVE_LATENCY_BUDGET,
+                           help="Frames of cameras and live sources waiting longer than given number of seconds "
+                                "are dropped")
+    argparser.add_argument("-resume", action="store_true",
+                           help="Continue interrupted analysis from its last checkpoint")
+    argparser.add_argument("-batch", type=str, nargs="+",
+                           help="Analyse all videos from given directories or matching given patterns "
+                                "(motion analysis only)")
+    argparser.add_argument("-batch_workers", type=int, default=os.cpu_count(),
+                           help="Number of processes analysing videos in batch mode")
+    argparser.add_argument("-manifest", type=str, default=defaults.BATCH_MANIFEST,
+                           help="File with status of every video analysed in batch mode")
+    argparser.add_argument("-results", type=str, default=defaults.BATCH_RESULTS_DIRECTORY,
+                           help="Directory for fragments found in batch mode")
+    argparser.add_argument("-thumbnails", action="store_true",
+                           help="Save a thumbnail of every fragment to <video>_thumbnails directory and all of them "
+                                "to <video>_contact_sheet.jpg")
+    argparser.add_argument("-export_workers", type=int, default=defaults.EXPORT_WORKERS,
+                           help="Number of processes encoding parts of shortcut video in parallel")
 
     args = argparser.parse_args()
     input_name = args.input_video
@@ -87,6 +451,24 @@ def main():
     if use_device:
         input_name = int(input_name)
 
+    if args.batch:
+        parameters = Parameters()
+        if parameter_file:
+            read_parameters_from_file(parameter_file, parameters)
+        run_batch_analysis(args.batch, parameters, args.batch_workers, args.manifest, args.results)
+        return
+
+    if args.live:
+        parameters = Parameters()
+        if parameter_file:
+            read_parameters_from_file(parameter_file, parameters)
+        object_detector = ObjectDetector(workers=args.detection_workers,
+                                         use_processes=args.detection_processes or defaults.DETECTION_USE_PROCESSES,
+                                         batch_size=args.detection_batch, on_result=report_live_objects)
+        run_live_analysis(args.live, parameters, object_detector, args.report_interval, args.latency)
+        object_detector.shutdown()
+        return
+
     parameters = Parameters()
     video_capture = initialize_video_capture(input_name, parameters)
 
@@ -97,45 +479,68 @@ def main():
 
     starting_point = time.time()
 
-    object_detector = ObjectDetector()
-    analyser = Analyser(parameters, object_detector, show_preview=False)
-    already_moving = False
-
     print("Beginning analysis...")
-
-    frame_counter = 1
-    ret, frame = video_capture.get_frame()
-    while running_analysis and (ret or use_device):
-        analysed_frame, motion_detected, return_frame_index = analyser.analyse_frame(frame)
-        if not motion_detected and already_moving:
-            already_moving = False
-            formatted = format_time(return_frame_index / video_capture.get_fps())
-            print("Fragment end: {}".format(formatted))
-        elif motion_detected and not already_moving:
-            already_moving = True
-            formatted = format_time(return_frame_index / video_capture.get_fps())
-            print("Fragment beginning: {}".format(formatted))
-
-        ret, frame = video_capture.get_frame()
-        frame_counter += 1
-
-    end_analyse_point = time.time()
-
-    print("Waiting for object detection to finish...")
-    analyser.wait_for_detection()
-    if already_moving:
-        formatted = format_time(frame_counter / video_capture.get_fps())
-        print("Fragment end: {}".format(formatted))
+    fragments = []
+
+    checkpoint = None
+    if args.resume and not use_device and not args.chunks:
+        checkpoint = load_checkpoint(input_name, parameters.as_dict())
+        if checkpoint is None:
+            print("There is no checkpoint to resume from, analysis begins from the beginning")
+
+    results_database = ResultsDatabase()
+    video_id = None
+    if not use_device:
+        video_id = register_video(results_database, input_name, video_capture, parameters, checkpoint is not None)
+
+    if args.chunks and not use_device:
+        end_analyse_point = run_chunked_analysis(input_name, video_capture, parameters, args.chunks, args.warmup,
+                                                 fragments)
+    else:
+        object_detector = ObjectDetector(workers=args.detection_workers,
+                                         use_processes=args.detection_processes or defaults.DETECTION_USE_PROCESSES,
+                                         batch_size=args.detection_batch, results=results_database)
+        thumbnails = None
+        if args.thumbnails and not use_device:
+            thumbnails = ThumbnailWriter(input_name, video_capture.get_fps())
+        if args.pipeline and not use_device:
+            end_analyse_point = run_pipelined_analysis(input_name, video_capture, parameters, object_detector,
+                                                       args.pipeline, fragments, checkpoint, args.warmup, thumbnails)
+        else:
+            end_analyse_point = run_sequential_analysis(input_name, video_capture, parameters, object_detector,
+                                                        use_device, fragments, checkpoint, args.warmup,
+                                                        args.latency, thumbnails)
+        object_detector.shutdown()
+        if thumbnails is not None:
+            contact_sheet_path = thumbnails.finish()
+            thumbnails.shutdown()
+            if contact_sheet_path is not None:
+                print("Thumbnails saved to {}".format(contact_sheet_path))
+
+        print("Frames skipped as similar to already detected ones: {}, detected frames: {}".format(
+            metrics.get_counter("detection.reused_frames"), metrics.get_counter("detection.frames")))
 
     end_all_point = time.time()
     print("Analysis completed")
 
+    if video_id is not None:
+        results_database.save_fragments(video_id, [(fragment_index, begin, end) for fragment_index, (begin, end)
+                                                   in enumerate(fragments) if end is not None])
+        print("Results saved to {}".format(defaults.RESULTS_DATABASE_PATH))
+
     print("Time spent on analysis: {} s".format(end_analyse_point - starting_point))
     print("Time spent on analysis including waiting for object detection: {} s".format(end_all_point -
                                                                                        starting_point))
     print("Video FPS: {}".format(video_capture.get_fps()))
     print("Video size: {} x {}".format(video_capture.width, video_capture.height))
 
+    if args.shortcut is not None and not use_device:
+        save_shortcut(input_name, video_capture, parameters, fragments, args.shortcut, args.export_workers)
+
+    if args.metrics:
+        metrics.dump(args.metrics)
+        print("Metrics saved to {}".format(args.metrics))
+
 
 if __name__ == '__main__':
     signal.signal(signal.SIGINT, sigint_handler)
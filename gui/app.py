@@ -1,8 +1,7 @@
 import datetime
+import queue
 import threading
 import time
-import yaml
-from pymediainfo import MediaInfo
 import tkinter
 import tkinter.filedialog as filedialog
 import tkinter.messagebox as messagebox
@@ -11,14 +10,25 @@ import tkinter.ttk as ttk
 
 import PIL.Image
 import PIL.ImageTk
-import yaml
 
 import misc.defaults as defaults
+from tools.adaptive_sampler import AdaptiveSampler
+from tools.analysis_index import AnalysisIndex
 from tools.analyse import Analyser
+from tools.checkpoint import can_save_checkpoint, get_checkpoint_state, load_checkpoint, remove_checkpoint, \
+    resume_analysis, save_checkpoint
+from tools.media_info import get_tagged_date
 from tools.object_detection.object_detector import ObjectDetector
 from tools.parameters import Parameters
-from tools.video_writer import VideoWriter
+from tools.pipeline import AnalysisPipeline
+from tools.results_database import ResultsDatabase
+from tools.shortcut_export import export_shortcut, export_shortcut_in_parallel
+from tools.thumbnails import ThumbnailWriter
+from tools.timeline import MotionTimeline, get_timeline_path
+from tools.video_writer import VideoWriter, get_shortcut_path
+from .frame_cache import FrameCache
 from .parameters_window import ParametersWindow
+from .playback import Playback
 from .video_capture import VideoCapture
 
 
@@ -27,13 +37,22 @@ class App:
         self.window = window
         self.window.title(window_title)
 
-        self.analyse_stats_path = "./analyse_stat.yaml"
+        self.analysis_index = AnalysisIndex()
+        self.results_database = ResultsDatabase()
+        self.video_id = None
+        self.annotations_lock = threading.Lock()
         self.path = None
         self.video_tagged_date = None
         self.video_source = None
         self.current_frame = None
         self.photo = None
+        # one canvas item shows all frames, its image is replaced
+        self.canvas_image = None
         self.play_video = False
+        self.playback = None
+        # frames shown while moving along a stopped video, the video itself is moved before it is read again
+        self.frame_cache = None
+        self.seek_pending = False
         self.analyse_on_the_fly = False
         self.already_moving = False
         self.moving_list = [None, None]
@@ -46,6 +65,16 @@ class App:
         self.moving_list_times = []
         self.motion_index = 0
         self.max_frame = 0
+        self.timeline = None
+        self.checkpoint = None
+
+        self.thumbnails = None
+        # thumbnails are saved by another thread, they are shown in the list of fragments by the main loop
+        self.ready_thumbnails = queue.Queue()
+        self.waiting_thumbnails = {}
+        self.thumbnail_images = {}
+        # items of the list for fragment indices, they stay the same when other fragments are removed
+        self.fragment_items = []
 
         self.__set_style()
         self.__create_frames()
@@ -54,7 +83,8 @@ class App:
         self.__fill_analyse_frame()
 
         self.timing_scale_value = 0
-        self.delay = 15
+        # frames are read at the frame rate of the video, the window is refreshed at most this often
+        self.delay = int(1000 / defaults.DISPLAY_FPS)
         self.update()
         self.analyser = None
         self.video_writer = None
@@ -66,6 +96,7 @@ class App:
         self._parameters_window = None
 
         self.window.resizable(False, False)
+        self.window.after(defaults.THUMBNAIL_POLL_INTERVAL, self.__show_thumbnails)
 
         self.window.mainloop()
 
@@ -78,6 +109,7 @@ class App:
                              "sticky": "nswe"}),
                            ("Horizontal.Progressbar.label", {"sticky": ""})])
         self.style.configure("text.Horizontal.TProgressbar", text="0 %")
+        self.style.configure("Treeview", rowheight=defaults.THUMBNAIL_HEIGHT + 4)
 
     def __create_frames(self):
         self.display_frame = tkinter.Frame(self.window, highlightbackground="black", highlightthickness=1)
@@ -123,7 +155,8 @@ class App:
         self.progress_bar.pack(side=tkinter.BOTTOM)
 
     def __fill_analyse_frame(self):
-        self.fragment_list = ttk.Treeview(self.analyse_frame, columns=["beginning", "end"], show="headings")
+        self.fragment_list = ttk.Treeview(self.analyse_frame, columns=["beginning", "end"], show="tree headings")
+        self.fragment_list.column("#0", width=defaults.THUMBNAIL_WIDTH + 20, stretch=False)
         self.fragment_list.heading("beginning", text="beginning")
         self.fragment_list.heading("end", text="end")
         self.fragment_list.bind("<Double-1>", self.__on_analysed_time_double_click)
@@ -166,7 +199,7 @@ class App:
             selected_motion = self.moving_list_frames[item_id]
             new_start_frame = selected_motion[0]
 
-            self.current_frame = new_start_frame
+            self.timing_scale.set(new_start_frame)
             self.move(new_start_frame)
 
 
@@ -182,6 +215,9 @@ class App:
             if device_index is None:
                 return
 
+            # results of the camera are not saved, they must not be mixed with results of the loaded video
+            self.video_id = None
+            self.results_database.detach_source()
             try:
                 self.video_source = VideoCapture(device_index, self._parameters, self.__update_canvas_size_with_video)
                 self.camera_used = True
@@ -199,23 +235,25 @@ class App:
     def browse(self):
         self.path = filedialog.askopenfilename()
         if self.path:
+            # the playback thread must not read the previous video anymore
+            self.stop()
+            if self.frame_cache is not None:
+                self.frame_cache.release()
+                self.frame_cache = None
             try:
                 self.video_source = VideoCapture(self.path, self._parameters, self.__update_canvas_size_with_video)
+                self.frame_cache = FrameCache(self.path, self._parameters)
                 self.__update_canvas_size_with_video()
-                # self.delay = int(1000 / self.video_source.get_fps())  # 1000 to obtain delay in microseconds
                 self.__clear_detections()
                 self.__initialize_analyser()
             except ValueError as e:
                 messagebox.showerror("Error", e)
 
             self.__init_analyse_stat()
+            self.video_id = None
+            self.timeline = MotionTimeline.load(get_timeline_path(self.path))
 
-            # mediainfo
-            self.video_tagged_date = None
-            media_info = MediaInfo.parse(self.path)
-            for track in media_info.tracks:
-                if track.track_type == "Video":
-                    self.video_tagged_date = track.tagged_date
+            self.video_tagged_date = get_tagged_date(self.path)
 
     def __clear_detections(self):
         self.fragment_list.delete(*self.fragment_list.get_children())
@@ -225,18 +263,38 @@ class App:
         self.moving_list_times = []
         self.motion_index = 0
         self.max_frame = 0
+        self.waiting_thumbnails = {}
+        self.thumbnail_images = {}
+        self.fragment_items = []
 
     def __init_analyse_stat(self):
-        with open(self.analyse_stats_path) as stat_file:
-            analysed_files = yaml.load(stat_file, Loader=yaml.FullLoader)
-        if analysed_files.get(self.path) is not None:
-            updated = {self.path: analysed_files.get(self.path) + 1}
-            analysed_files.update(updated)
-        else:
-            analysed_files[self.path] = 0
-        print("[INFO] analyse index: " + str(analysed_files.get(self.path)))
-        with open(self.analyse_stats_path, "w") as stat_file:
-            yaml.dump(analysed_files, stat_file)
+        print("[INFO] analyse index: " + str(self.analysis_index.increment(self.path)))
+
+    def __register_video(self, resumed=False):
+        # every loaded video is a separate entry of results, resumed analysis continues the interrupted one
+        if not self.path or self.camera_used or self.video_source is None:
+            return
+        if resumed:
+            self.video_id = self.results_database.get_last_video(self.path)
+        if self.video_id is None:
+            self.video_id = self.results_database.add_video(
+                self.path, self.analysis_index.get_index(self.path), self.video_source.get_fps(),
+                self.video_source.get_frames_num(), self.video_tagged_date, self._parameters.as_dict())
+        self.results_database.attach_source(self.video_id)
+
+    def __record_fragment(self, index):
+        if self.video_id is not None:
+            self.results_database.save_fragments(self.video_id, [(index, *self.moving_list_frames[index])])
+            self.export_annotations()
+
+    def export_annotations(self):
+        # text annotations are generated from the results database whenever new results are saved
+        if self.video_id is None:
+            return
+        path = self.path[0: self.path.rfind("."):] + "_annotations_" + \
+            str(self.analysis_index.get_index(self.path)) + ".txt"
+        with self.annotations_lock:
+            self.results_database.export_annotations(self.video_id, path)
 
     def __update_canvas_size(self, width, height):
         self.canvas.config(width=width, height=height)
@@ -259,30 +317,107 @@ class App:
         if self.current_frame is not None:
             image = PIL.Image.fromarray(self.current_frame)
             image = image.resize((int(width), int(height)), PIL.Image.ANTIALIAS)
-            self.photo = PIL.ImageTk.PhotoImage(image=image)
-            self.canvas.create_image(0, 0, image=self.photo, anchor=tkinter.NW)
+            self.__show_image(image)
+
+    def __show_image(self, image):
+        # image of the same size is copied into the existing photo, so nothing new is created on the canvas
+        if self.photo is not None and (self.photo.width(), self.photo.height()) == image.size:
+            self.photo.paste(image)
+            return
+
+        self.photo = PIL.ImageTk.PhotoImage(image=image)
+        if self.canvas_image is None:
+            self.canvas_image = self.canvas.create_image(0, 0, image=self.photo, anchor=tkinter.NW)
+        else:
+            self.canvas.itemconfig(self.canvas_image, image=self.photo)
+
+    def __show_frame(self, frame):
+        self.current_frame = frame
+        self.__show_image(PIL.Image.fromarray(frame))
 
     def play(self):
         if not self.play_video:
             self.play_video = True
+            self.__apply_pending_seek()
+            self.playback = Playback(self.video_source, self.__analyse_frame_on_the_fly, not self.camera_used,
+                                     self.__set_analysed_frame)
+            self.playback.start(self.timing_scale_value)
             self.update()
 
     def stop(self):
         self.play_video = False
+        self.__stop_playback()
+
+    def __stop_playback(self):
+        if self.playback is not None:
+            self.playback.stop()
+            # results of frames analysed before stopping are not lost
+            self.__show_playback_results()
+            self.playback = None
 
     def move(self, val):
         int_val = int(val)
-        self.video_source.set_frame(int_val)
+        if int_val == self.timing_scale_value:
+            # the scale follows played frames, its position is already shown
+            return
+
+        if self.playback is not None:
+            self.playback.seek(int_val)
+        elif self.frame_cache is not None and not self.camera_used:
+            # seeking is slow, the video is moved only when it is played or analysed
+            frame = self.frame_cache.get_frame(int_val)
+            if frame is not None:
+                self.__show_frame(frame)
+            self.seek_pending = True
+        else:
+            self.video_source.set_frame(int_val)
         self.timing_scale_value = int_val
+        self.__show_time()
+        # frames are played by the playback thread, it moves the analyser when it moves the video
+        if self.playback is None:
+            self.__set_analysed_frame(int_val)
+
+    def __set_analysed_frame(self, position):
         if self.analyser is not None:
-            self.analyser.set_frame_counter(int_val)
+            self.analyser.set_frame_counter(position)
+
+    def __apply_pending_seek(self):
+        if self.seek_pending:
+            self.video_source.set_frame(self.timing_scale_value)
+            self.seek_pending = False
 
     def open_parameters_button(self):
         if self._parameters_window is None:
-            self._parameters_window = ParametersWindow(self.window, self._parameters)
+            self._parameters_window = ParametersWindow(self.window, self._parameters, self.refresh_fragments)
         else:
             self._parameters_window.show()
 
+    def __get_timeline(self):
+        if self.analyser is not None and self.analyser.get_timeline() is not None \
+                and len(self.analyser.get_timeline()) > 0:
+            return self.analyser.get_timeline()
+        return self.timeline
+
+    def refresh_fragments(self):
+        # fragments are found again from recorded motion timeline, without analysing the video
+        timeline = self.__get_timeline()
+        if timeline is None or self.video_source is None:
+            messagebox.showinfo("Information", "There is no motion timeline for this video, "
+                                               "analyse it with timeline recording enabled")
+            return
+
+        fragments = timeline.segment(self._parameters.minimal_move_area, self._parameters.max_contours,
+                                     self._parameters.minimal_move_frames, self._parameters.max_break_length)
+        self.__clear_detections()
+        fps = self.video_source.get_fps()
+        for begin, end in fragments:
+            self.moving_list_frames.append([begin, end])
+            self.moving_list_times.append([begin / fps, end / fps])
+            self.mark_fragment([begin / fps, end / fps])
+
+        self.motion_index = len(fragments)
+        self.max_frame = fragments[-1][1] if len(fragments) > 0 else 0
+
     def undo_detection(self):
         selection_list = self.fragment_list.selection()
         if len(selection_list) == 0:
@@ -295,33 +430,19 @@ class App:
     def save_shortcut(self):
         if self.analyser is None:
             return
+        fragments = [motion for motion in self.moving_list_frames if motion[1] is not None]
+        if defaults.EXPORT_WORKERS > 1:
+            export_shortcut_in_parallel(self.path, self._parameters, fragments, get_shortcut_path(self.path),
+                                        defaults.EXPORT_WORKERS, self.video_tagged_date)
+            messagebox.showinfo("Information", "Shortcut saved")
+            return
+
         if self.video_writer is None:
             print(self.video_source.width)
             self.video_writer = VideoWriter(self.video_source.width, self.video_source.height)
 
         self.video_writer.initialize_video_writer(self.path)
-        for motion in self.moving_list_frames:
-            start_motion = motion[0]
-            end_motion = motion[1]
-            if self.video_tagged_date is not None:
-                start = datetime.datetime.strptime(self.video_tagged_date, '%Z %Y-%m-%d %H:%M:%S') \
-                        + datetime.timedelta(
-                    seconds=int(start_motion / self.video_source.get_fps())) - datetime.timedelta(seconds=int(
-                    self.video_source.get_frames_num() / self.video_source.get_fps()))
-                end = datetime.datetime.strptime(self.video_tagged_date, '%Z %Y-%m-%d %H:%M:%S') \
-                      + datetime.timedelta(seconds=int(end_motion / self.video_source.get_fps())) - datetime.timedelta(
-                    seconds=int(
-                        self.video_source.get_frames_num() / self.video_source.get_fps()))
-                self.video_writer.add_black_frame(str(start), str(end),
-                                                  self.video_source.get_frame_by_index(start_motion)[1], True)
-            else:
-                self.video_writer.add_black_frame(str(time.strftime("%H:%M:%S", time.gmtime(start_motion /
-                                                                                            self.video_source.get_fps()))),
-                                                  str(time.strftime("%H:%M:%S", time.gmtime(end_motion /
-                                                                                            self.video_source.get_fps()))),
-                                                  self.video_source.get_frame_by_index(start_motion)[1], False)
-            for frame_index in range(start_motion, end_motion + 1):
-                self.video_writer.add_frame(self.video_source.get_frame_by_index(frame_index)[1])
+        export_shortcut(self.video_source, fragments, self.video_writer, self.video_tagged_date)
         self.video_writer.release()
         messagebox.showinfo("Information", "Shortcut saved")
 
@@ -330,6 +451,8 @@ class App:
             self.__initialize_analyser()
 
         self.analyse_on_the_fly = bool(self.analyse_checked.get())
+        if self.analyse_on_the_fly and self.video_id is None:
+            self.__register_video()
 
     def __switch_buttons(self, stop_analyse_state, others_state):
         self.stop_analyse_video_button["state"] = stop_analyse_state
@@ -349,6 +472,13 @@ class App:
         self.__switch_buttons(tkinter.DISABLED, tkinter.NORMAL)
 
     def start_analysis(self):
+        self.checkpoint = None
+        if self.path and not self.camera_used:
+            checkpoint = load_checkpoint(self.path, self._parameters.as_dict())
+            if checkpoint is not None and messagebox.askyesno(
+                    "Checkpoint", "Analysis of this video has been interrupted. Do you want to continue it?"):
+                self.checkpoint = checkpoint
+
         self.__disable_buttons()
 
         self.run_analysis_thread = True
@@ -361,14 +491,48 @@ class App:
             self.__end_analysis()
             self.analysis_thread.join()
             self.analyser.wait_for_detection()
+            self.__save_contact_sheet()
             self.analysis_thread = None
             self.__enable_buttons()
 
     def __initialize_analyser(self):
-        self.object_detector = ObjectDetector(self)
-        self.analyser = Analyser(self._parameters, self.object_detector, self.preview_checked.get())
+        self.object_detector = ObjectDetector(self, results=self.results_database)
+        if self.thumbnails is not None:
+            self.thumbnails.shutdown()
+            self.thumbnails = None
+        if self.path and not self.camera_used:
+            self.thumbnails = ThumbnailWriter(self.path, self.video_source.get_fps(), self.__on_thumbnail_ready)
+        self.analyser = Analyser(self._parameters, self.object_detector, self.preview_checked.get(),
+                                 thumbnails=self.thumbnails)
         self.jump_to_video_beginning()
 
+    def __on_thumbnail_ready(self, index, path):
+        self.ready_thumbnails.put((index, path))
+
+    def __show_thumbnails(self):
+        # a thumbnail can be ready before its fragment is added to the list, then it waits for it
+        while not self.ready_thumbnails.empty():
+            index, path = self.ready_thumbnails.get()
+            self.waiting_thumbnails[index] = path
+
+        for index, path in list(self.waiting_thumbnails.items()):
+            if index < len(self.fragment_items):
+                item = self.fragment_items[index]
+                # the fragment may have been removed from the list
+                if self.fragment_list.exists(item):
+                    image = PIL.ImageTk.PhotoImage(image=PIL.Image.open(path))
+                    self.fragment_list.item(item, image=image)
+                    self.thumbnail_images[index] = image
+                del self.waiting_thumbnails[index]
+
+        self.window.after(defaults.THUMBNAIL_POLL_INTERVAL, self.__show_thumbnails)
+
+    def __save_contact_sheet(self):
+        if self.thumbnails is not None:
+            contact_sheet_path = self.thumbnails.finish()
+            if contact_sheet_path is not None:
+                print("Thumbnails saved to {}".format(contact_sheet_path))
+
     def analyse_video(self):
         starting_point = time.time()
 
@@ -378,28 +542,29 @@ class App:
         if self.analyser is None:
             self.__initialize_analyser()
 
-        ret, frame = self.video_source.get_frame()
-        frames_number = self.video_source.get_frames_num()
-        self.timing_scale_value = 1
-
-        while ret and self.run_analysis_thread:
-            self.__analyse_frame_update_list(frame)
-            ret, frame = self.video_source.get_frame()
-            self.timing_scale_value += 1
-
-            if self.timing_scale_value % 10 == 0:
-                percent = 100.0 * self.timing_scale_value / frames_number
-                self.__set_progress_bar_value(percent)
+        self.__apply_pending_seek()
+        self.__register_video(resumed=self.checkpoint is not None)
+        position = self.__resume_from_checkpoint()
+        if self._parameters.adaptive_sampling:
+            self.__analyse_video_sampled(position)
+        else:
+            self.__analyse_video_pipelined(position)
 
         end_analyse_point = time.time()
 
         if self.run_analysis_thread:
+            if self.path and not self.camera_used:
+                remove_checkpoint(self.path)
             print("Waiting for object detection...")
             self.__end_analysis()
             self.analyser.wait_for_detection()
+            self.__save_contact_sheet()
             self.__set_progress_bar_value(100.0)
             self.__enable_buttons()
 
+        if self.analyser.get_timeline() is not None and self.path and not self.camera_used:
+            self.analyser.get_timeline().save(get_timeline_path(self.path))
+
         end_all_point = time.time()
 
         print("Time spent on analysis: {:.2f} s".format(end_analyse_point - starting_point))
@@ -409,6 +574,87 @@ class App:
         print("Video size: {} x {}".format(self.video_source.width, self.video_source.height))
         messagebox.showinfo("Information", "Analysis completed successfully")
 
+    def __resume_from_checkpoint(self):
+        # returns position of the first frame to analyse
+        if self.checkpoint is None:
+            return 0
+
+        self.__clear_detections()
+        progress = self.checkpoint["progress"]
+        self.moving_list = progress["moving_list"]
+        self.moving_list_frames = progress["moving_list_frames"]
+        self.moving_list_times = progress["moving_list_times"]
+        self.motion_index = progress["motion_index"]
+        self.max_frame = progress["max_frame"]
+        self.already_moving = progress["already_moving"]
+        for moving_times in self.moving_list_times[:self.motion_index]:
+            self.mark_fragment(moving_times)
+
+        position = resume_analysis(self.path, self.video_source, self.analyser, self.checkpoint,
+                                   defaults.CHUNK_WARMUP_FRAMES)
+        self.timing_scale_value = position
+        self.checkpoint = None
+        return position
+
+    def __save_checkpoint(self, analyser_state):
+        if not self.path or self.camera_used:
+            return
+
+        progress = {
+            "moving_list": self.moving_list,
+            "moving_list_frames": self.moving_list_frames,
+            "moving_list_times": self.moving_list_times,
+            "motion_index": self.motion_index,
+            "max_frame": self.max_frame,
+            "already_moving": self.already_moving
+        }
+        save_checkpoint(self.path, self._parameters.as_dict(), analyser_state["frame_counter"], analyser_state,
+                        progress, self.analyser.get_timeline())
+
+    def __analyse_video_sampled(self, position):
+        sampler = AdaptiveSampler(self.video_source, self.analyser, self._parameters.idle_sampling_interval, position)
+        ret, frame = sampler.read()
+        frames_number = self.video_source.get_frames_num()
+        self.timing_scale_value = position + 1
+        analysed_frames = 1
+        next_checkpoint = position + defaults.CHECKPOINT_INTERVAL
+
+        while ret and self.run_analysis_thread:
+            self.__analyse_frame_update_list(frame)
+            sampler.update()
+            if sampler.position >= next_checkpoint and can_save_checkpoint(self.analyser, sampler):
+                self.__save_checkpoint(get_checkpoint_state(self.analyser))
+                next_checkpoint = sampler.position + defaults.CHECKPOINT_INTERVAL
+
+            ret, frame = sampler.read()
+            self.timing_scale_value = sampler.position
+            analysed_frames += 1
+
+            if analysed_frames % 10 == 0:
+                percent = 100.0 * self.timing_scale_value / frames_number
+                self.__set_progress_bar_value(percent)
+
+    def __analyse_video_pipelined(self, position):
+        pipeline = AnalysisPipeline(self.video_source.get_frame, self.__analyse_frame_with_state,
+                                    defaults.PIPELINE_QUEUE_SIZE, position + 1)
+        frames_number = self.video_source.get_frames_num()
+
+        for frame_number, (analysed_frame, motion_detected, return_frame_index, state) in pipeline.results():
+            if not self.run_analysis_thread:
+                break
+
+            self.timing_scale_value = frame_number
+            self.__update_list(motion_detected, return_frame_index)
+            if state is not None:
+                self.__save_checkpoint(state)
+
+            if self.timing_scale_value % 10 == 0:
+                percent = 100.0 * self.timing_scale_value / frames_number
+                self.__set_progress_bar_value(percent)
+
+        pipeline.stop()
+        print("Analysis queues: {}".format(pipeline.get_statistics()))
+
     def __end_analysis(self):
         if self.moving_list[0] is not None:
             self.max_frame = self.timing_scale_value
@@ -420,6 +666,7 @@ class App:
 
             print("Motion detected: {} - {}".format(self.moving_list_times[self.motion_index][0],
                                                     self.moving_list_times[self.motion_index][1]))
+            self.__record_fragment(self.motion_index)
             self.motion_index += 1
             self.mark_fragment(self.moving_list)
             self.analyser.run_object_analysis()
@@ -445,41 +692,65 @@ class App:
 
     def jump_to_video_beginning(self):
         self.video_source.set_frame(0)
+        self.seek_pending = False
 
         ret, frame = self.video_source.get_frame()
         if ret:
             self.timing_scale.destroy()
-            self.current_frame = frame
-            self.photo = PIL.ImageTk.PhotoImage(image=PIL.Image.fromarray(frame))
-            self.canvas.create_image(0, 0, image=self.photo, anchor=tkinter.NW)
+            self.__show_frame(frame)
             self.timing_scale = tkinter.Scale(self.control_frame, command=self.move, orient=tkinter.HORIZONTAL,
                                               length=600, showvalue=0, to=self.video_source.get_frames_num())
             self.timing_scale.pack(side=tkinter.TOP)
             self.timing_scale_value = 0
 
     def update(self):
-        # Get a frame from the video source
         if self.play_video:
-            ret, frame = self.video_source.get_frame()
-
-            if ret:
-                if self.analyse_on_the_fly:
-                    frame = self.__analyse_frame_update_list(frame)
-                self.current_frame = frame
-                self.photo = PIL.ImageTk.PhotoImage(image=PIL.Image.fromarray(frame))
-                self.canvas.create_image(0, 0, image=self.photo, anchor=tkinter.NW)
-                self.timing_scale_value += 1
-                self.timing_scale.set(self.timing_scale_value)
-                start_time = datetime.datetime(100, 1, 1, 0, 0, 0)
-                self.timing_video.config(text=str((start_time + datetime.timedelta(
-                    seconds=int(self.timing_scale_value / self.video_source.get_fps()))).time()))
+            self.__show_playback_results()
+            if not self.playback.is_running():
+                # the end of the video
+                self.play_video = False
+                self.__stop_playback()
+                return
             self.window.after(self.delay, self.update)
 
-    def __analyse_frame_update_list(self, frame):
-        perform_object_detection = self.timing_scale_value >= self.max_frame
-        analysed_frame, motion_detected, return_frame_index = self.analyser.analyse_frame(frame,
-                                                                                          perform_object_detection)
-
+    def __show_playback_results(self):
+        # all results of analysis are put on the list, only the newest frame is shown
+        for _, motion_detected, return_frame_index in self.playback.get_results():
+            self.__update_list(motion_detected, return_frame_index)
+
+        newest_frame = self.playback.get_frame()
+        if newest_frame is not None:
+            frame_number, frame = newest_frame
+            self.__show_frame(frame)
+            self.timing_scale_value = frame_number
+            self.timing_scale.set(self.timing_scale_value)
+            self.__show_time()
+
+    def __show_time(self):
+        fps = self.video_source.get_fps()
+        if not fps:
+            return
+        start_time = datetime.datetime(100, 1, 1, 0, 0, 0)
+        self.timing_video.config(text=str((start_time + datetime.timedelta(
+            seconds=int(self.timing_scale_value / fps))).time()))
+
+    def __analyse_frame_on_the_fly(self, frame_number, frame):
+        # runs in the playback thread
+        if not self.analyse_on_the_fly or self.analyser is None:
+            return frame, False, None
+        return self.__analyse_frame(frame_number, frame)
+
+    def __analyse_frame(self, frame_number, frame):
+        perform_object_detection = frame_number >= self.max_frame
+        return self.analyser.analyse_frame(frame, perform_object_detection)
+
+    def __analyse_frame_with_state(self, frame_number, frame):
+        # analysis runs ahead of the list of fragments, so its state for a checkpoint is taken right after the frame
+        analysed_frame, motion_detected, return_frame_index = self.__analyse_frame(frame_number, frame)
+        state = get_checkpoint_state(self.analyser) if frame_number % defaults.CHECKPOINT_INTERVAL == 0 else None
+        return analysed_frame, motion_detected, return_frame_index, state
+
+    def __update_list(self, motion_detected, return_frame_index):
         if return_frame_index is not None:
             if not motion_detected and self.already_moving and return_frame_index >= self.max_frame:
                 self.max_frame = max(return_frame_index, self.max_frame)
@@ -495,6 +766,7 @@ class App:
 
                 print("Motion detected: {} - {}".format(self.moving_list_times[self.motion_index][0],
                                                         self.moving_list_times[self.motion_index][1]))
+                self.__record_fragment(self.motion_index)
                 self.motion_index += 1
                 self.moving_list = [None, None]
 
@@ -505,11 +777,9 @@ class App:
                 self.moving_list_frames.append([return_frame_index, None])
                 self.moving_list_times.append([self.moving_list[0], None])
 
-        return analysed_frame
-
     def mark_fragment(self, moving_list):
         formatted = [time.strftime("%H:%M:%S", time.gmtime(element)) for element in moving_list]
-        self.fragment_list.insert("", "end", values=formatted)
+        self.fragment_items.append(self.fragment_list.insert("", "end", values=formatted))
 
     def get_moving_times(self, index):
         return self.moving_list_times[index]
@@ -0,0 +1,121 @@
+import collections
+import threading
+
+import misc.defaults as defaults
+from tools.instrumentation import metrics
+from .video_capture import VideoCapture
+
+
+# Keeps recently shown frames of a video, already decoded and resized, so moving the scale back and
+# forth does not seek the video again. Frames around the shown one are read in the background,
+# from the first missing one forwards, because decoding consecutive frames is much faster than
+# seeking. The cache opens the video on its own, so it never moves the played or analysed video.
+class FrameCache:
+    def __init__(self, video_path, parameters, memory_budget=defaults.FRAME_CACHE_MEMORY_BUDGET,
+                 prefetch_frames=defaults.FRAME_CACHE_PREFETCH_FRAMES):
+        self._video_capture = VideoCapture(video_path, parameters)
+        self._frames_number = int(self._video_capture.get_frames_num())
+        # in bytes
+        self._memory_budget = memory_budget
+        self._prefetch_frames = prefetch_frames
+
+        self._frames = collections.OrderedDict()
+        self._used_memory = 0
+        self._size = None
+        self._lock = threading.Lock()
+
+        # the video is read by one thread at a time, position is the index of the next frame to read
+        self._video_lock = threading.Lock()
+        self._position = 0
+
+        self._prefetch_center = None
+        self._prefetch_event = threading.Event()
+        self._running = True
+        self._thread = threading.Thread(target=self.__prefetch, daemon=True)
+        self._thread.start()
+
+    def get_frame(self, index):
+        # returns the frame with given index, from the cache or decoded, and starts reading frames around it
+        frame = self.__get_cached(index)
+        if frame is None:
+            metrics.increment("frame_cache.misses")
+            frame = self.__read(index)
+        else:
+            metrics.increment("frame_cache.hits")
+
+        self._prefetch_center = index
+        self._prefetch_event.set()
+        return frame
+
+    def release(self):
+        self._running = False
+        self._prefetch_event.set()
+        self._thread.join()
+        self._video_capture.release_video()
+
+    def __get_cached(self, index):
+        with self._lock:
+            # frames of the previous size are useless after analysis parameters have changed
+            size = (self._video_capture.width, self._video_capture.height)
+            if size != self._size:
+                self._frames.clear()
+                self._used_memory = 0
+                self._size = size
+
+            frame = self._frames.get(index)
+            if frame is not None:
+                self._frames.move_to_end(index)
+            return frame
+
+    def __add(self, index, frame):
+        with self._lock:
+            if index in self._frames:
+                return
+            self._frames[index] = frame
+            self._used_memory += frame.nbytes
+            while self._used_memory > self._memory_budget and len(self._frames) > 1:
+                _, removed_frame = self._frames.popitem(last=False)
+                self._used_memory -= removed_frame.nbytes
+
+    def __read(self, index):
+        with self._video_lock:
+            # close frames ahead are reached by skipping, further ones and frames behind by seeking
+            if index < self._position or index - self._position > defaults.FRAME_CACHE_MAX_SKIP:
+                self._video_capture.set_frame(index)
+                self._position = index
+            while self._position < index:
+                if not self._video_capture.grab_frame():
+                    return None
+                self._position += 1
+
+            ret, frame = self._video_capture.get_frame()
+            if not ret:
+                return None
+            self._position += 1
+
+        self.__add(index, frame)
+        return frame
+
+    def __get_missing_frame(self, center):
+        # the first missing frame of the range around the center, or None when all of them are cached
+        begin = max(0, center - self._prefetch_frames // 4)
+        end = min(self._frames_number, center + self._prefetch_frames)
+        with self._lock:
+            for index in range(begin, end):
+                if index not in self._frames:
+                    return index
+        return None
+
+    def __prefetch(self):
+        while self._running:
+            self._prefetch_event.wait()
+            self._prefetch_event.clear()
+
+            # reading stops as soon as another frame is shown, then the range around it is read
+            while self._running and not self._prefetch_event.is_set():
+                center = self._prefetch_center
+                index = self.__get_missing_frame(center) if center is not None else None
+                if index is None:
+                    break
+                if self.__read(index) is None:
+                    break
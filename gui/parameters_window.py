@@ -28,11 +28,12 @@ class CheckbuttonEntry(tkinter.Checkbutton):
 
 
 class ParametersWindow(tkinter.Toplevel):
-    def __init__(self, parent, parameters):
+    def __init__(self, parent, parameters, refresh_callback=None):
         self.original_frame = parent
         tkinter.Toplevel.__init__(self)
 
         self._parameters = parameters
+        self._refresh_callback = refresh_callback
         self.title("Set analysis parameters")
         self._entries_values = []
 
@@ -40,6 +41,7 @@ class ParametersWindow(tkinter.Toplevel):
         self.__fill_mode_frame()
         self.__fill_video_size_frame()
         self.__fill_analyse_parameters_frame()
+        self.__fill_performance_frame()
         self.__fill_buttons_frame()
         self.__fill_entries_with_current_parameters()
 
@@ -62,6 +64,10 @@ class ParametersWindow(tkinter.Toplevel):
         self._running_avg_parameters_frame.grid(row=current_row)
         current_row += 1
 
+        self._performance_frame = tkinter.LabelFrame(self, text="Performance settings")
+        self._performance_frame.grid(row=current_row)
+        current_row += 1
+
         self._buttons_frame = tkinter.Frame(self)
         self._buttons_frame.grid(row=current_row)
 
@@ -232,6 +238,85 @@ class ParametersWindow(tkinter.Toplevel):
         self._entries_values.append((object_detection_interval_entry, "object_detection_interval"))
         current_row += 1
 
+    def __fill_performance_frame(self):
+        current_row = 0
+
+        self.use_proxy_value_type = tkinter.BooleanVar()
+        use_proxy_checkbutton = CheckbuttonEntry(self._performance_frame,
+                                                 text="Analyse motion on low resolution grayscale proxy",
+                                                 variable=self.use_proxy_value_type,
+                                                 command=self.__proxy_switch)
+        use_proxy_checkbutton.grid(row=current_row, columnspan=2)
+        self._entries_values.append((use_proxy_checkbutton, "use_proxy"))
+        current_row += 1
+
+        self._proxy_scale_label = tkinter.Label(self._performance_frame, text="Proxy scale")
+        self._proxy_scale_label.grid(row=current_row, column=0)
+
+        self._proxy_scale_entry = tkinter.Entry(self._performance_frame)
+        self._proxy_scale_entry.grid(row=current_row, column=1)
+        self._entries_values.append((self._proxy_scale_entry, "proxy_scale"))
+        current_row += 1
+
+        self.adaptive_sampling_value_type = tkinter.BooleanVar()
+        adaptive_sampling_checkbutton = CheckbuttonEntry(self._performance_frame,
+                                                         text="Analyse only some frames when there is no motion",
+                                                         variable=self.adaptive_sampling_value_type,
+                                                         command=self.__adaptive_sampling_switch)
+        adaptive_sampling_checkbutton.grid(row=current_row, columnspan=2)
+        self._entries_values.append((adaptive_sampling_checkbutton, "adaptive_sampling"))
+        current_row += 1
+
+        self._idle_sampling_interval_label = tkinter.Label(self._performance_frame, text="Idle sampling interval")
+        self._idle_sampling_interval_label.grid(row=current_row, column=0)
+
+        self._idle_sampling_interval_entry = tkinter.Entry(self._performance_frame)
+        self._idle_sampling_interval_entry.grid(row=current_row, column=1)
+        self._entries_values.append((self._idle_sampling_interval_entry, "idle_sampling_interval"))
+        current_row += 1
+
+        self.detect_motion_regions_value_type = tkinter.BooleanVar()
+        detect_motion_regions_checkbutton = CheckbuttonEntry(self._performance_frame,
+                                                             text="Detect objects only in regions with motion",
+                                                             variable=self.detect_motion_regions_value_type,
+                                                             command=self.__motion_regions_switch)
+        detect_motion_regions_checkbutton.grid(row=current_row, columnspan=2)
+        self._entries_values.append((detect_motion_regions_checkbutton, "detect_motion_regions"))
+        current_row += 1
+
+        self._region_padding_label = tkinter.Label(self._performance_frame, text="Region padding")
+        self._region_padding_label.grid(row=current_row, column=0)
+
+        self._region_padding_entry = tkinter.Entry(self._performance_frame)
+        self._region_padding_entry.grid(row=current_row, column=1)
+        self._entries_values.append((self._region_padding_entry, "region_padding"))
+        current_row += 1
+
+        self.suppress_duplicates_value_type = tkinter.BooleanVar()
+        suppress_duplicates_checkbutton = CheckbuttonEntry(self._performance_frame,
+                                                           text="Skip detection of repeated frames",
+                                                           variable=self.suppress_duplicates_value_type,
+                                                           command=self.__suppress_duplicates_switch)
+        suppress_duplicates_checkbutton.grid(row=current_row, columnspan=2)
+        self._entries_values.append((suppress_duplicates_checkbutton, "suppress_duplicates"))
+        current_row += 1
+
+        self._duplicate_hash_distance_label = tkinter.Label(self._performance_frame, text="Max frames difference")
+        self._duplicate_hash_distance_label.grid(row=current_row, column=0)
+
+        self._duplicate_hash_distance_entry = tkinter.Entry(self._performance_frame)
+        self._duplicate_hash_distance_entry.grid(row=current_row, column=1)
+        self._entries_values.append((self._duplicate_hash_distance_entry, "duplicate_hash_distance"))
+        current_row += 1
+
+        self.record_timeline_value_type = tkinter.BooleanVar()
+        record_timeline_checkbutton = CheckbuttonEntry(self._performance_frame,
+                                                       text="Record motion timeline",
+                                                       variable=self.record_timeline_value_type)
+        record_timeline_checkbutton.grid(row=current_row, columnspan=2)
+        self._entries_values.append((record_timeline_checkbutton, "record_timeline"))
+        current_row += 1
+
     def __sigmadelta_switch(self):
         state = tkinter.NORMAL if self.begin_with_sigmadelta_value_type.get() else tkinter.DISABLED
         self._sigmadelta_frames_label["state"] = state
@@ -244,6 +329,26 @@ class ParametersWindow(tkinter.Toplevel):
         self._dilation_iterations_label["state"] = state
         self._dilation_iterations_entry["state"] = state
 
+    def __proxy_switch(self):
+        state = tkinter.NORMAL if self.use_proxy_value_type.get() else tkinter.DISABLED
+        self._proxy_scale_label["state"] = state
+        self._proxy_scale_entry["state"] = state
+
+    def __adaptive_sampling_switch(self):
+        state = tkinter.NORMAL if self.adaptive_sampling_value_type.get() else tkinter.DISABLED
+        self._idle_sampling_interval_label["state"] = state
+        self._idle_sampling_interval_entry["state"] = state
+
+    def __motion_regions_switch(self):
+        state = tkinter.NORMAL if self.detect_motion_regions_value_type.get() else tkinter.DISABLED
+        self._region_padding_label["state"] = state
+        self._region_padding_entry["state"] = state
+
+    def __suppress_duplicates_switch(self):
+        state = tkinter.NORMAL if self.suppress_duplicates_value_type.get() else tkinter.DISABLED
+        self._duplicate_hash_distance_label["state"] = state
+        self._duplicate_hash_distance_entry["state"] = state
+
     def __fill_buttons_frame(self):
         current_row = 0
 
@@ -253,6 +358,12 @@ class ParametersWindow(tkinter.Toplevel):
         self._close_button = tkinter.Button(self._buttons_frame, text="Cancel", command=self.cancel)
         self._close_button.grid(row=current_row, column=1)
 
+        if self._refresh_callback is not None:
+            current_row += 1
+            self._refresh_button = tkinter.Button(self._buttons_frame, text="Save and refresh fragments",
+                                                  command=self.save_and_refresh)
+            self._refresh_button.grid(row=current_row, columnspan=2)
+
     def __fill_entries_with_current_parameters(self):
         for entry, attribute in self._entries_values:
             entry.delete(0, "end")
@@ -264,7 +375,8 @@ class ParametersWindow(tkinter.Toplevel):
             entry.insert(0, dictionary[attribute])
 
     def __switch_custom(self, state):
-        frames = (self._video_size_frame, self._analyse_parameters_frame, self._running_avg_parameters_frame)
+        frames = (self._video_size_frame, self._analyse_parameters_frame, self._running_avg_parameters_frame,
+                  self._performance_frame)
         for frame in frames:
             for child in frame.winfo_children():
                 child.configure(state=state)
@@ -287,5 +399,10 @@ class ParametersWindow(tkinter.Toplevel):
 
         self.withdraw()
 
+    def save_and_refresh(self):
+        # fragments are found again from motion timeline of the last analysis
+        self.save_parameters()
+        self._refresh_callback()
+
     def cancel(self):
         self.withdraw()
@@ -0,0 +1,96 @@
+import collections
+import threading
+import time
+
+import misc.defaults as defaults
+
+
+# Reads frames of the played video in its own thread, following the frame rate of the video
+# (frames of cameras are read as they come). Frames can be analysed on the fly, results of analysis
+# are passed to the window by a queue, while only the newest frame is kept for display, so the
+# window shows frames as often as it can and skips the rest without stopping playback.
+class Playback:
+    def __init__(self, video_source, analyse_frame=None, paced=True, on_seek=None):
+        self._video_source = video_source
+        # called with frame number and frame, returns displayed frame, whether motion is detected
+        # and index of frame where motion state changed (or None)
+        self._analyse_frame = analyse_frame
+        self._paced = paced
+        # called with the new position from the playback thread, before the first frame after seeking is read
+        self._on_seek = on_seek
+        self._fps = video_source.get_fps() or defaults.LIVE_DEFAULT_FPS
+
+        self._lock = threading.Lock()
+        self._results = collections.deque()
+        self._newest_frame = None
+        self._seek_position = None
+
+        self._running = False
+        self._thread = None
+
+    def start(self, position):
+        self._running = True
+        self._thread = threading.Thread(target=self.__run, args=(position,), daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def is_running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def seek(self, position):
+        # the video is read only by the playback thread, so it moves to the position itself
+        with self._lock:
+            self._seek_position = position
+
+    def get_results(self):
+        # returns all results published since the last call, in the order of frames
+        with self._lock:
+            results = list(self._results)
+            self._results.clear()
+        return results
+
+    def get_frame(self):
+        # returns number and the newest frame, or None when there is no new frame since the last call
+        with self._lock:
+            newest_frame = self._newest_frame
+            self._newest_frame = None
+        return newest_frame
+
+    def __run(self, position):
+        start_time = time.time()
+        start_position = position
+        while self._running:
+            with self._lock:
+                seek_position = self._seek_position
+                self._seek_position = None
+            if seek_position is not None:
+                self._video_source.set_frame(seek_position)
+                if self._on_seek is not None:
+                    self._on_seek(seek_position)
+                position = start_position = seek_position
+                start_time = time.time()
+
+            if self._paced:
+                delay = start_time + (position - start_position) / self._fps - time.time()
+                if delay > 0:
+                    time.sleep(delay)
+
+            ret, frame = self._video_source.get_frame()
+            if not ret:
+                break
+
+            if self._analyse_frame is not None:
+                frame, motion_detected, return_frame_index = self._analyse_frame(position, frame)
+            else:
+                return_frame_index = None
+            position += 1
+
+            with self._lock:
+                if return_frame_index is not None:
+                    self._results.append((position, motion_detected, return_frame_index))
+                self._newest_frame = (position, frame)
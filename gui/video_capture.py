@@ -1,17 +1,38 @@
+import os
 import tkinter.messagebox
 
 import cv2
 
+from tools.instrumentation import metrics
+from tools.video_index import find_keyframe, get_video_info
+
 
 class VideoCapture:
     def __init__(self, video_source, parameters, size_change_callback=None):
         self.vid = cv2.VideoCapture(video_source)
         if not self.vid.isOpened():
-            tkinter.messagebox.showerror(title="Error", message="Unable to open video source " + video_source)
+            try:
+                tkinter.messagebox.showerror(title="Error", message="Unable to open video source " + str(video_source))
+            except tkinter.TclError:
+                # there is no display in console and worker processes
+                pass
             raise ValueError("Unable to open video source", video_source)
 
-        self.source_width = self.vid.get(cv2.CAP_PROP_FRAME_WIDTH)
-        self.source_height = self.vid.get(cv2.CAP_PROP_FRAME_HEIGHT)
+        # files are probed once, their properties and keyframes are read from the index afterwards
+        if isinstance(video_source, str) and os.path.isfile(video_source):
+            self.index = get_video_info(video_source)
+            self.source_width = self.index["width"]
+            self.source_height = self.index["height"]
+            self.fps = self.index["fps"]
+            self.frames_number = self.index["frames_number"]
+        else:
+            self.index = None
+            self.source_width = self.vid.get(cv2.CAP_PROP_FRAME_WIDTH)
+            self.source_height = self.vid.get(cv2.CAP_PROP_FRAME_HEIGHT)
+            self.fps = self.__read_fps()
+            self.frames_number = self.vid.get(cv2.CAP_PROP_FRAME_COUNT)
+        # number of the next frame to read
+        self.position = 0
         self.resize = False
 
         self.parameters = parameters
@@ -44,12 +65,16 @@ class VideoCapture:
 
     def get_frame(self):
         if self.vid.isOpened():
-            ret, frame = self.vid.read()
+            with metrics.timer("video.decode"):
+                ret, frame = self.vid.read()
             if ret:
+                self.position += 1
                 # Return a boolean success flag and the current frame converted to RGB
                 self.__check_resize()
                 if self.resize:
-                    frame = cv2.resize(frame, (self.parameters.max_video_width, self.parameters.max_video_height))
+                    with metrics.timer("video.resize"):
+                        frame = cv2.resize(frame, (self.parameters.max_video_width,
+                                                   self.parameters.max_video_height))
 
                 return ret, frame
             else:
@@ -57,13 +82,41 @@ class VideoCapture:
         else:
             return None, None
 
+    def grab_frame(self):
+        # moves to the next frame without decoding it
+        if self.vid.isOpened():
+            with metrics.timer("video.grab"):
+                ret = self.vid.grab()
+            if ret:
+                self.position += 1
+            return ret
+        else:
+            return False
+
     def set_frame(self, val):
-        self.vid.set(cv2.CAP_PROP_POS_FRAMES, int(val))
+        frame_number = int(val)
+        keyframe = find_keyframe(self.index, frame_number) if self.index is not None else None
+        if keyframe is None:
+            self.vid.set(cv2.CAP_PROP_POS_FRAMES, frame_number)
+            self.position = frame_number
+            return
+
+        # frames ahead in the same group of pictures are reached by decoding forward, without seeking
+        if not keyframe <= self.position <= frame_number:
+            with metrics.timer("video.seek"):
+                self.vid.set(cv2.CAP_PROP_POS_FRAMES, keyframe)
+            self.position = keyframe
+        while self.position < frame_number:
+            if not self.grab_frame():
+                break
 
     def get_frames_num(self):
-        return self.vid.get(cv2.CAP_PROP_FRAME_COUNT)
+        return self.frames_number
 
     def get_fps(self):
+        return self.fps
+
+    def __read_fps(self):
         (opencv_version, _, _) = cv2.__version__.split(".")
         if int(opencv_version) < 3:
             return self.vid.get(cv2.cv.CV_CAP_PROP_FPS)
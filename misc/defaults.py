@@ -14,3 +14,52 @@ MAX_CONTOURS = 500
 MINIMAL_MOVE_FRAMES = 10
 MAX_BREAK_LENGTH = 10
 OBJECT_DETECTION_INTERVAL = 30
+
+PROXY_SCALE = 0.5
+IDLE_SAMPLING_INTERVAL = 5
+REGION_PADDING = 32
+DUPLICATE_HASH_DISTANCE = 5
+
+CHUNK_WARMUP_FRAMES = 500
+PIPELINE_QUEUE_SIZE = 16
+
+EXPORT_SEEK_THRESHOLD = 250
+EXPORT_WORKERS = 1
+
+CHECKPOINT_INTERVAL = 5000
+
+LIVE_DEFAULT_FPS = 25
+LIVE_REPORT_INTERVAL = 10
+# frames of live sources waiting longer than this are dropped, in seconds
+LIVE_LATENCY_BUDGET = 0.5
+LIVE_RING_SIZE = 4
+
+ANALYSIS_INDEX_PATH = "./analysis_index.db"
+# indices were kept in this file before, it is read once when the database is created
+LEGACY_ANALYSIS_STAT_PATH = "./analyse_stat.yaml"
+RESULTS_DATABASE_PATH = "./results.db"
+
+# the window shows played video at most with this frame rate, remaining frames are skipped
+DISPLAY_FPS = 30
+
+# decoded frames kept for moving along the video, in bytes
+FRAME_CACHE_MEMORY_BUDGET = 256 * 1024 * 1024
+# frames read in the background after the shown one (and a quarter of it before)
+FRAME_CACHE_PREFETCH_FRAMES = 50
+# farther frames ahead are reached by seeking instead of skipping consecutive ones
+FRAME_CACHE_MAX_SKIP = 30
+
+THUMBNAIL_WIDTH = 120
+THUMBNAIL_HEIGHT = 90
+THUMBNAIL_QUALITY = 85
+CONTACT_SHEET_COLUMNS = 6
+# how often thumbnails saved during analysis are added to the list of fragments, in milliseconds
+THUMBNAIL_POLL_INTERVAL = 200
+
+BATCH_MANIFEST = "batch_manifest.json"
+BATCH_RESULTS_DIRECTORY = "batch_results"
+
+DETECTION_WORKERS = 1
+DETECTION_USE_PROCESSES = False
+DETECTION_BATCH_SIZE = 8
+DETECTION_CACHE_SIZE = 256
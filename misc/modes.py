@@ -14,7 +14,16 @@ DEFAULT_MODE = {
     "max_contours": MAX_CONTOURS,
     "minimal_move_frames": MINIMAL_MOVE_FRAMES,
     "max_break_length": MAX_BREAK_LENGTH,
-    "object_detection_interval": OBJECT_DETECTION_INTERVAL
+    "object_detection_interval": OBJECT_DETECTION_INTERVAL,
+    "use_proxy": False,
+    "proxy_scale": PROXY_SCALE,
+    "adaptive_sampling": False,
+    "idle_sampling_interval": IDLE_SAMPLING_INTERVAL,
+    "detect_motion_regions": False,
+    "region_padding": REGION_PADDING,
+    "suppress_duplicates": False,
+    "duplicate_hash_distance": DUPLICATE_HASH_DISTANCE,
+    "record_timeline": False
 }
 
 FAST_MODE = {
@@ -31,7 +40,16 @@ FAST_MODE = {
     "max_contours": MAX_CONTOURS,
     "minimal_move_frames": MINIMAL_MOVE_FRAMES,
     "max_break_length": MAX_BREAK_LENGTH,
-    "object_detection_interval": 60
+    "object_detection_interval": 60,
+    "use_proxy": True,
+    "proxy_scale": PROXY_SCALE,
+    "adaptive_sampling": True,
+    "idle_sampling_interval": IDLE_SAMPLING_INTERVAL,
+    "detect_motion_regions": False,
+    "region_padding": REGION_PADDING,
+    "suppress_duplicates": False,
+    "duplicate_hash_distance": DUPLICATE_HASH_DISTANCE,
+    "record_timeline": False
 }
 
 CHANGING_LIGHT_MODE = {
@@ -48,5 +66,14 @@ CHANGING_LIGHT_MODE = {
     "max_contours": 100,
     "minimal_move_frames": MINIMAL_MOVE_FRAMES,
     "max_break_length": MAX_BREAK_LENGTH,
-    "object_detection_interval": OBJECT_DETECTION_INTERVAL
+    "object_detection_interval": OBJECT_DETECTION_INTERVAL,
+    "use_proxy": False,
+    "proxy_scale": PROXY_SCALE,
+    "adaptive_sampling": False,
+    "idle_sampling_interval": IDLE_SAMPLING_INTERVAL,
+    "detect_motion_regions": False,
+    "region_padding": REGION_PADDING,
+    "suppress_duplicates": False,
+    "duplicate_hash_distance": DUPLICATE_HASH_DISTANCE,
+    "record_timeline": False
 }
@@ -0,0 +1,100 @@
+import argparse
+import json
+import os
+import time
+
+import misc.defaults as defaults
+from gui.video_capture import VideoCapture
+from tools.parameters import Parameters
+from tools.results_database import ResultsDatabase, parse_date
+from tools.shortcut_export import export_shortcut, get_fragment_description
+from tools.video_writer import VideoWriter
+
+
+def format_fragment(fragment):
+    start, end, _ = get_fragment_description(fragment["begin_frame"], fragment["end_frame"], fragment["fps"],
+                                             fragment["frames_number"], fragment["tagged_date"])
+    objects = fragment["objects"] if fragment["objects"] else "-"
+    return "{} [{}] {} - {}: {}".format(fragment["path"], fragment["fragment_index"] + 1, start, end, objects)
+
+
+def get_query_shortcut_path(video_path, output_directory):
+    name = os.path.splitext(os.path.basename(video_path))[0] + "_query_shortcut.avi"
+    return os.path.join(output_directory or os.path.dirname(video_path), name)
+
+
+def save_shortcuts(fragments, output_directory):
+    # found fragments of every video are saved to its own shortcut, frames have the size used in analysis
+    videos = {}
+    for fragment in fragments:
+        videos.setdefault(fragment["path"], []).append(fragment)
+
+    for video_path, video_fragments in videos.items():
+        if not os.path.exists(video_path):
+            print("{} does not exist anymore, its fragments are skipped".format(video_path))
+            continue
+
+        parameters = Parameters()
+        parameters.update_from_dict(json.loads(video_fragments[0]["parameters"]) or {})
+        video_capture = VideoCapture(video_path, parameters)
+        output_path = get_query_shortcut_path(video_path, output_directory)
+        video_writer = VideoWriter(video_capture.width, video_capture.height)
+        video_writer.initialize_video_writer(video_path, output_path)
+        written_frames = export_shortcut(video_capture, [[fragment["begin_frame"], fragment["end_frame"]]
+                                                         for fragment in video_fragments],
+                                         video_writer, video_fragments[0]["tagged_date"])
+        video_writer.release()
+        video_capture.release_video()
+        print("Shortcut with {} frames saved to {}".format(written_frames, output_path))
+
+
+def main():
+    argparser = argparse.ArgumentParser(description="Search fragments found by analyses of CCTV recordings")
+    argparser.add_argument("-database", type=str, default=defaults.RESULTS_DATABASE_PATH,
+                           help="Results database")
+    argparser.add_argument("-video", type=str,
+                           help="Pattern of paths of videos, e.g. \"*/camera3/*\"")
+    argparser.add_argument("-since", type=str, help="Fragments ending after given date (YYYY-MM-DD [HH:MM[:SS]])")
+    argparser.add_argument("-until", type=str, help="Fragments beginning before given date (YYYY-MM-DD [HH:MM[:SS]])")
+    argparser.add_argument("-hours", type=str, nargs=2, metavar=("FROM", "TO"),
+                           help="Fragments beginning between given times of every day (HH:MM)")
+    argparser.add_argument("-object", type=str, nargs="+", help="Fragments with any of given objects detected")
+    argparser.add_argument("-confidence", type=float, help="Minimal confidence of detected objects")
+    argparser.add_argument("-all", action="store_true",
+                           help="Search results of all analyses of videos, not only the latest ones")
+    argparser.add_argument("-limit", type=int, help="Maximal number of found fragments")
+    argparser.add_argument("-shortcut", type=str, nargs="?", const="",
+                           help="Save found fragments of every video to <video>_query_shortcut.avi "
+                                "(in given directory or next to the video)")
+
+    args = argparser.parse_args()
+
+    if not os.path.exists(args.database):
+        print("Results database {} does not exist".format(args.database))
+        return
+
+    try:
+        since = parse_date(args.since) if args.since else None
+        until = parse_date(args.until) if args.until else None
+    except ValueError as e:
+        print(e)
+        return
+
+    starting_point = time.time()
+    results_database = ResultsDatabase(args.database)
+    fragments = results_database.find_fragments(args.video, since, until, args.object, args.confidence, args.hours,
+                                                args.limit, not args.all)
+    query_time = time.time() - starting_point
+
+    for fragment in fragments:
+        print(format_fragment(fragment))
+    print("Fragments found: {} in {:.3f} s".format(len(fragments), query_time))
+
+    if args.shortcut is not None and len(fragments) > 0:
+        if args.shortcut:
+            os.makedirs(args.shortcut, exist_ok=True)
+        save_shortcuts(fragments, args.shortcut)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,48 @@
+# Reads frames for analysis, skipping frames without decoding them while there is no motion.
+# When motion appears on a sampled frame, the skipped frames are read again, so the fragment begins
+# at the same frame as in full analysis. Frame counter of the analyser is kept equal to the position
+# in the video, so returned frame indices are real ones.
+class AdaptiveSampler:
+    def __init__(self, video_capture, analyser, interval, position=0):
+        self._video_capture = video_capture
+        self._analyser = analyser
+        self._interval = max(1, interval)
+        self._position = position
+        self._last_sampled_position = position
+        self._dense_until = position
+        self._sparse = True
+
+    @property
+    def position(self):
+        return self._position
+
+    def read(self):
+        if self._sparse:
+            self._last_sampled_position = self._position
+            for _ in range(self._interval - 1):
+                if not self._video_capture.grab_frame():
+                    return False, None
+                self._position += 1
+
+        ret, frame = self._video_capture.get_frame()
+        if ret:
+            self._position += 1
+            self._analyser.set_frame_counter(self._position - 1)
+
+        return ret, frame
+
+    def update(self):
+        # has to be called after analysis of each frame returned by read
+        if self._sparse:
+            if not self._analyser.is_idle():
+                self.__backfill()
+        elif self._analyser.is_idle() and self._position >= self._dense_until:
+            self._sparse = True
+
+    def __backfill(self):
+        self._sparse = False
+        self._dense_until = self._position
+        if self._position - self._last_sampled_position > 1:
+            self._analyser.reset_motion(self._last_sampled_position)
+            self._video_capture.set_frame(self._last_sampled_position)
+            self._position = self._last_sampled_position
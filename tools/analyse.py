@@ -1,10 +1,13 @@
 import threading
-from threading import Thread
 
 import cv2
 import pybgs
 
+from .instrumentation import metrics
+from .regions import get_detection_regions
+from .signatures import region_hash
 from .subtractors import BgSubtractorType
+from .timeline import MotionTimeline
 
 SUBTRACTORS = {
     BgSubtractorType.KNN: cv2.createBackgroundSubtractorKNN,
@@ -13,13 +16,21 @@ SUBTRACTORS = {
     BgSubtractorType.AdaptiveSegmenter: pybgs.PixelBasedAdaptiveSegmenter
 }
 
+# subtractors which can be fed with single channel frames, the rest expects BGR input
+GRAYSCALE_SUBTRACTORS = {BgSubtractorType.KNN}
+
 NO_MOVEMENT_INDEX = -1
 
 
 class Analyser:
-    def __init__(self, parameters, detector, show_preview=True):
+    def __init__(self, parameters, detector, show_preview=True, source=None, thumbnails=None):
         self._parameters = parameters
+        # passed to the detector shared by analysers of several sources
+        self._source = source
         self._frame_counter = 0
+        self._subtractor_type = None
+        # SigmaDelta used at the beginning is replaced after given number of frames
+        self._initial_subtractor_used = False
         self._background_subtractor = self.__initialize_bg_subtractor()
 
         self._movement_begin = NO_MOVEMENT_INDEX
@@ -29,49 +40,86 @@ class Analyser:
         self._motion_detected = False
         self._object_detector = detector
         self._frames_to_detect = []
-        self._detection_threads = []
+        # frame counters of frames to detect, needed to read them again when analysis is resumed
+        self._frames_to_detect_indices = []
 
         self._motion_index = 0
         self._lock = threading.Lock()
 
+        # writer of thumbnails, the frame with the largest motion area of every fragment is passed to it
+        self._thumbnails = thumbnails
+        self._best_frame = None
+
         self._show_preview = show_preview
 
+        self._timeline = None
+
     def __initialize_bg_subtractor(self):
         if self._parameters.begin_with_sigmadelta:
+            self._subtractor_type = BgSubtractorType.SigmaDelta
+            self._initial_subtractor_used = True
             return pybgs.SigmaDelta()
         else:
             return self.__create_bg_subtractor()
 
     def __create_bg_subtractor(self):
         bg_subtractor = self._parameters.bg_subtractor_enum
+        self._subtractor_type = bg_subtractor
         subtractor_initializer = SUBTRACTORS.get(bg_subtractor, cv2.BackgroundSubtractorKNN)
         return subtractor_initializer()
 
     def run_object_analysis(self):
-        t = Thread(target=self._object_detector.detect_objects, args=(self._frames_to_detect, self._motion_index))
-        t.start()
-        self._detection_threads.append(t)
+        if self._object_detector is not None:
+            self._object_detector.submit(self._frames_to_detect, self._motion_index,
+                                         self._parameters.duplicate_hash_distance, self._source,
+                                         self._frames_to_detect_indices)
+        if self._thumbnails is not None and self._best_frame is not None:
+            _, frame_number, frame = self._best_frame
+            self._thumbnails.submit(self._motion_index, frame_number, frame)
+        self._best_frame = None
         self._frames_to_detect = []
+        self._frames_to_detect_indices = []
         self._motion_index += 1
 
     def analyse_frame(self, frame, perform_object_detection=True):
         return_frame_index = None
         self._frame_counter += 1
+        metrics.increment("analysis.frames")
         self.__switch_subtractors_if_needed()
         bg_mask = self.__get_bg_mask(frame)
 
         if self._parameters.use_threshold:
-            bg_threshold = self.__get_thresholded_mask(bg_mask)
+            with metrics.timer("analysis.threshold"):
+                bg_threshold = self.__get_thresholded_mask(bg_mask)
         else:
             bg_threshold = bg_mask
 
-        contours_bg = self.__get_contours(bg_threshold)
+        with metrics.timer("analysis.contours"):
+            contours_bg = self.__get_contours(bg_threshold)
         found_contours = len(contours_bg)
-        contours_bg = list(filter(lambda cnt: cv2.contourArea(cnt) >= self._parameters.minimal_move_area, contours_bg))
+        with metrics.timer("analysis.filtering"):
+            # areas are expressed for the original frame, also when the proxy is analysed
+            areas = [cv2.contourArea(cnt) / self.__get_scale() ** 2 for cnt in contours_bg]
+            contours_bg = [cnt for cnt, area in zip(contours_bg, areas)
+                           if area >= self._parameters.minimal_move_area]
+        if self._parameters.record_timeline:
+            if self._timeline is None:
+                self._timeline = MotionTimeline()
+            self._timeline.add(self._frame_counter, found_contours, sum(areas), max(areas, default=0))
+        motion_boxes = []
+        signature = None
 
         if len(contours_bg) > 0 and found_contours < self._parameters.max_contours:
             self.__set_motion_counters()
-            self.__mark_contours(contours_bg, frame)
+            motion_boxes = self.__get_motion_boxes(contours_bg)
+            # signature of a frame which may be queued for detection is taken before boxes are drawn on it
+            if self._moving_frames % self._parameters.object_detection_interval == 0:
+                signature = self.__get_signature(frame, motion_boxes)
+            # thumbnails show the frame without boxes
+            if self._thumbnails is not None:
+                self.__update_best_frame(frame, areas)
+            with metrics.timer("analysis.drawing"):
+                self.__mark_boxes(motion_boxes, frame)
 
             if self._moving_frames >= self._parameters.minimal_move_frames:
                 self._motion_detected = True
@@ -80,18 +128,26 @@ class Analyser:
             self.__set_break_counters()
 
             if self._breaking_frames >= self._parameters.max_break_length:
+                if self._motion_detected:
+                    metrics.increment("analysis.fragments")
                 if perform_object_detection and self._motion_detected:
                     self.run_object_analysis()
 
                 return_frame_index = self._movement_end
                 self.__unmark_motion()
 
-        if self._motion_detected and self._moving_frames % self._parameters.object_detection_interval == 0:
-            self._frames_to_detect.append(frame)
+        if self._object_detector is not None and self._motion_detected \
+                and self._moving_frames % self._parameters.object_detection_interval == 0:
+            if signature is None:
+                signature = self.__get_signature(frame, motion_boxes)
+            self._frames_to_detect.append((frame, self.__get_detection_regions(frame, motion_boxes), signature))
+            self._frames_to_detect_indices.append(self._frame_counter)
+            metrics.increment("analysis.detection_frames")
 
         status = "Motion detected" if self._motion_detected else "No motion"
-        cv2.putText(frame, "Status: {}".format(status), (10, 20), cv2.FONT_HERSHEY_SIMPLEX,
-                    0.5, (0, 0, 255), 2)
+        with metrics.timer("analysis.drawing"):
+            cv2.putText(frame, "Status: {}".format(status), (10, 20), cv2.FONT_HERSHEY_SIMPLEX,
+                        0.5, (0, 0, 255), 2)
 
         if self._show_preview:
             with self._lock:
@@ -102,14 +158,41 @@ class Analyser:
         return frame, self._motion_detected, return_frame_index
 
     def __switch_subtractors_if_needed(self):
-        if self._parameters.begin_with_sigmadelta and self._frame_counter == self._parameters.sigmadelta_frames:
+        # frame counter can jump over the switching point when frames are skipped
+        if self._initial_subtractor_used and self._frame_counter >= self._parameters.sigmadelta_frames:
+            self._initial_subtractor_used = False
             self._background_subtractor = self.__create_bg_subtractor()
             print("Switching algorithm...")
 
+    def __get_scale(self):
+        return self._parameters.proxy_scale if self._parameters.use_proxy else 1.0
+
     def __get_bg_mask(self, frame):
-        frame_copy = frame.copy()
-        frame_copy = cv2.GaussianBlur(frame_copy, (self._parameters.blur_size, self._parameters.blur_size), 0)
-        return self._background_subtractor.apply(frame_copy)
+        if self._parameters.use_proxy:
+            with metrics.timer("analysis.proxy"):
+                analysed_frame = self.__get_proxy_frame(frame)
+        else:
+            analysed_frame = frame
+
+        blur_size = self.__get_blur_size()
+        with metrics.timer("analysis.blur"):
+            analysed_frame = cv2.GaussianBlur(analysed_frame, (blur_size, blur_size), 0)
+        with metrics.timer("analysis.subtractor"):
+            if analysed_frame.ndim == 2 and self._subtractor_type not in GRAYSCALE_SUBTRACTORS:
+                analysed_frame = cv2.cvtColor(analysed_frame, cv2.COLOR_GRAY2BGR)
+
+            return self._background_subtractor.apply(analysed_frame)
+
+    def __get_proxy_frame(self, frame):
+        # conversion first, so the resize works on a single channel
+        gray_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        scale = self._parameters.proxy_scale
+        return cv2.resize(gray_frame, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+
+    def __get_blur_size(self):
+        # kernel is scaled together with the frame, it has to stay odd
+        blur_size = max(1, int(self._parameters.blur_size * self.__get_scale()))
+        return blur_size if blur_size % 2 == 1 else blur_size + 1
 
     def __get_thresholded_mask(self, bg_mask):
         bg_threshold = cv2.threshold(bg_mask, self._parameters.delta_threshold, 255, cv2.THRESH_BINARY)[1]
@@ -138,17 +221,46 @@ class Analyser:
         self._movement_end = self._frame_counter
         self._moving_frames += 1
 
-    @staticmethod
-    def __mark_contours(contours_bg, frame):
+    def __get_motion_boxes(self, contours_bg):
+        scale = self.__get_scale()
+        boxes = []
         for contour in contours_bg:
             (x, y, w, h) = cv2.boundingRect(contour)
+            boxes.append((int(x / scale), int(y / scale), int(w / scale), int(h / scale)))
+
+        return boxes
+
+    @staticmethod
+    def __mark_boxes(boxes, frame):
+        for (x, y, w, h) in boxes:
             cv2.rectangle(frame, (x, y), (x + w, y + h), (0, 255, 0), 2)
 
+    def __get_signature(self, frame, motion_boxes):
+        if not self._parameters.suppress_duplicates:
+            return None
+
+        return region_hash(frame, motion_boxes)
+
+    def __get_detection_regions(self, frame, motion_boxes):
+        # None means that the whole frame is passed to object detection
+        if not self._parameters.detect_motion_regions:
+            return None
+
+        (height, width) = frame.shape[:2]
+        return get_detection_regions(motion_boxes, self._parameters.region_padding, width, height)
+
     def __set_break_counters(self):
         if self._movement_begin != NO_MOVEMENT_INDEX:
             self._breaking_frames += 1
 
+    def __update_best_frame(self, frame, areas):
+        # only a frame with larger motion than the previous best one is copied
+        motion_area = sum(area for area in areas if area >= self._parameters.minimal_move_area)
+        if self._best_frame is None or motion_area > self._best_frame[0]:
+            self._best_frame = (motion_area, self._frame_counter, frame.copy())
+
     def __unmark_motion(self):
+        self._best_frame = None
         self._motion_detected = False
         self._movement_begin = NO_MOVEMENT_INDEX
         self._movement_end = NO_MOVEMENT_INDEX
@@ -160,11 +272,74 @@ class Analyser:
         cv2.destroyAllWindows()
 
     def wait_for_detection(self):
-        for thread in self._detection_threads:
-            thread.join()
+        if self._object_detector is not None:
+            self._object_detector.wait()
 
     def set_preview_mode(self, mode):
         self._show_preview = mode
 
     def set_frame_counter(self, value):
         self._frame_counter = value
+
+    def start_at(self, frame_counter):
+        # when analysis does not begin from the first frame, the subtractor has to be the one
+        # which would be used at this point of a video analysed from the beginning
+        self._frame_counter = frame_counter
+        if self._parameters.begin_with_sigmadelta and frame_counter < self._parameters.sigmadelta_frames:
+            self._subtractor_type = BgSubtractorType.SigmaDelta
+            self._initial_subtractor_used = True
+            self._background_subtractor = pybgs.SigmaDelta()
+        else:
+            self._initial_subtractor_used = False
+            self._background_subtractor = self.__create_bg_subtractor()
+
+    def warm_up(self, frame):
+        # only the background model is updated, motion state is not changed
+        self._frame_counter += 1
+        self.__switch_subtractors_if_needed()
+        self.__get_bg_mask(frame)
+
+    def get_state(self):
+        return {
+            "frame_counter": self._frame_counter,
+            "movement_begin": self._movement_begin,
+            "movement_end": self._movement_end,
+            "moving_frames": self._moving_frames,
+            "breaking_frames": self._breaking_frames,
+            "motion_detected": self._motion_detected,
+            "motion_index": self._motion_index,
+            "frames_to_detect": [[index, regions, signature] for index, (_, regions, signature)
+                                 in zip(self._frames_to_detect_indices, self._frames_to_detect)]
+        }
+
+    def restore_state(self, state, frames_to_detect, timeline=None):
+        # frames to detect are given in the same order as in the state
+        self._frame_counter = state["frame_counter"]
+        self._movement_begin = state["movement_begin"]
+        self._movement_end = state["movement_end"]
+        self._moving_frames = state["moving_frames"]
+        self._breaking_frames = state["breaking_frames"]
+        self._motion_detected = state["motion_detected"]
+        self._motion_index = state["motion_index"]
+
+        self._frames_to_detect = []
+        self._frames_to_detect_indices = []
+        for (index, regions, signature), frame in zip(state["frames_to_detect"], frames_to_detect):
+            if regions is not None:
+                regions = [tuple(region) for region in regions]
+            self._frames_to_detect.append((frame, regions, signature))
+            self._frames_to_detect_indices.append(index)
+
+        self._timeline = timeline
+
+    def get_timeline(self):
+        return self._timeline
+
+    def is_idle(self):
+        return self._movement_begin == NO_MOVEMENT_INDEX
+
+    def reset_motion(self, frame_counter):
+        # analysis goes back to given frame counter, records of frames after it are added again
+        self.__unmark_motion()
+        if self._timeline is not None:
+            self._timeline.truncate(frame_counter + 1)
@@ -0,0 +1,77 @@
+import os
+import sqlite3
+
+import yaml
+
+import misc.defaults as defaults
+
+# how long a connection waits for another process holding the database, in seconds
+LOCK_TIMEOUT = 30
+# version of the database stored in its user_version, 0 means that it has not been created yet
+SCHEMA_VERSION = 1
+
+
+# Stores how many times every video has been analysed. The index is a part of names of
+# annotation and shortcut files, so results of consecutive analyses do not overwrite each other.
+# Every operation uses its own connection, so the store can be shared by threads and processes,
+# and the index is increased in one transaction, so parallel analyses never get the same one.
+class AnalysisIndex:
+    def __init__(self, path=defaults.ANALYSIS_INDEX_PATH, legacy_path=defaults.LEGACY_ANALYSIS_STAT_PATH):
+        self._path = path
+        self._legacy_path = legacy_path
+        self.__create()
+
+    def __connect(self):
+        # isolation_level None lets transactions be started explicitly
+        return sqlite3.connect(self._path, timeout=LOCK_TIMEOUT, isolation_level=None)
+
+    def __create(self):
+        connection = self.__connect()
+        try:
+            if connection.execute("PRAGMA user_version").fetchone()[0] >= SCHEMA_VERSION:
+                return
+
+            # the database is created only by one process, others wait for it and see it already created
+            connection.execute("BEGIN IMMEDIATE")
+            if connection.execute("PRAGMA user_version").fetchone()[0] < SCHEMA_VERSION:
+                connection.execute("CREATE TABLE IF NOT EXISTS analysed_files "
+                                   "(path TEXT PRIMARY KEY, analyse_index INTEGER NOT NULL)")
+                connection.executemany("INSERT OR IGNORE INTO analysed_files VALUES (?, ?)", self.__read_legacy())
+                connection.execute("PRAGMA user_version = {}".format(SCHEMA_VERSION))
+            connection.execute("COMMIT")
+        finally:
+            connection.close()
+
+    def __read_legacy(self):
+        # indices written before the database existed are copied once, the old file is left untouched
+        if self._legacy_path is None or not os.path.exists(self._legacy_path):
+            return []
+
+        with open(self._legacy_path) as stat_file:
+            analysed_files = yaml.load(stat_file, Loader=yaml.FullLoader)
+        if not isinstance(analysed_files, dict):
+            return []
+        return [(path, index) for path, index in analysed_files.items() if isinstance(index, int)]
+
+    def get_index(self, path):
+        # returns None for videos which have never been analysed
+        connection = self.__connect()
+        try:
+            row = connection.execute("SELECT analyse_index FROM analysed_files WHERE path = ?", (path,)).fetchone()
+        finally:
+            connection.close()
+        return row[0] if row is not None else None
+
+    def increment(self, path):
+        # returns the new index, 0 for the first analysis of a video
+        connection = self.__connect()
+        try:
+            connection.execute("BEGIN IMMEDIATE")
+            connection.execute("INSERT INTO analysed_files VALUES (?, 0) "
+                               "ON CONFLICT(path) DO UPDATE SET analyse_index = analyse_index + 1", (path,))
+            index = connection.execute("SELECT analyse_index FROM analysed_files WHERE path = ?",
+                                       (path,)).fetchone()[0]
+            connection.execute("COMMIT")
+        finally:
+            connection.close()
+        return index
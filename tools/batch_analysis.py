@@ -0,0 +1,202 @@
+import concurrent.futures
+import glob
+import hashlib
+import json
+import os
+import signal
+import time
+
+from gui.video_capture import VideoCapture
+from .adaptive_sampler import AdaptiveSampler
+from .analyse import Analyser
+from .analysis_index import AnalysisIndex
+from .media_info import get_tagged_date
+from .parameters import Parameters
+from .video_index import get_file_state
+
+VIDEO_EXTENSIONS = (".mp4", ".avi", ".mkv", ".mov", ".mpg", ".mpeg", ".ts", ".h264")
+
+# how often the batch checks whether it has been interrupted, in seconds
+STOP_CHECK_INTERVAL = 0.1
+
+STATUS_COMPLETED = "completed"
+STATUS_FAILED = "failed"
+
+# set in a worker process by Ctrl+C, files already passed to the worker are not analysed then
+_interrupted = False
+
+
+def find_videos(patterns):
+    # patterns are directories (searched recursively), glob patterns or single files
+    videos = []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            paths = glob.glob(os.path.join(pattern, "**", "*"), recursive=True)
+            paths = [path for path in paths if path.lower().endswith(VIDEO_EXTENSIONS)]
+        else:
+            paths = glob.glob(pattern)
+
+        for path in sorted(paths):
+            path = os.path.abspath(path)
+            if os.path.isfile(path) and path not in videos:
+                videos.append(path)
+
+    return videos
+
+
+def _interrupt_worker(signum, frame):
+    global _interrupted
+    _interrupted = True
+    raise KeyboardInterrupt
+
+
+def restore_interrupt_handler():
+    # workers inherit the handler of the console, Ctrl+C has to stop their analysis at once instead
+    signal.signal(signal.SIGINT, _interrupt_worker)
+
+
+def get_result_path(video_path, output_directory):
+    # recorders often use the same file names for every camera, so the name contains a hash of the whole path
+    name = os.path.splitext(os.path.basename(video_path))[0]
+    path_hash = hashlib.sha1(video_path.encode()).hexdigest()[:8]
+    return os.path.join(output_directory, "{}_{}_fragments.json".format(name, path_hash))
+
+
+def analyse_file(video_path, parameters_values, output_directory):
+    # runs in a worker process, only motion analysis is performed
+    if _interrupted:
+        raise KeyboardInterrupt
+    starting_point = time.time()
+    parameters = Parameters()
+    parameters.update_from_dict(parameters_values)
+    video_capture = VideoCapture(video_path, parameters)
+    fps = video_capture.get_fps()
+
+    analyser = Analyser(parameters, None, show_preview=False)
+    sampler = None
+    read_frame = video_capture.get_frame
+    if parameters.adaptive_sampling:
+        sampler = AdaptiveSampler(video_capture, analyser, parameters.idle_sampling_interval)
+        read_frame = sampler.read
+
+    fragments = []
+    fragment_begin = None
+    frames_number = 0
+    ret, frame = read_frame()
+    while ret:
+        _, motion_detected, return_frame_index = analyser.analyse_frame(frame, perform_object_detection=False)
+        if sampler is not None:
+            sampler.update()
+        frames_number = sampler.position if sampler is not None else frames_number + 1
+
+        if motion_detected and fragment_begin is None:
+            fragment_begin = return_frame_index
+        elif not motion_detected and fragment_begin is not None and return_frame_index is not None:
+            fragments.append([fragment_begin, return_frame_index])
+            fragment_begin = None
+
+        ret, frame = read_frame()
+
+    if fragment_begin is not None:
+        fragments.append([fragment_begin, frames_number])
+    video_capture.release_video()
+
+    result_path = get_result_path(video_path, output_directory)
+    with open(result_path, "w") as result_file:
+        json.dump({"video": video_path, "fps": fps, "frames": frames_number, "tagged_date": get_tagged_date(video_path),
+                   "fragments": [{"begin_frame": begin, "end_frame": end, "begin": begin / fps, "end": end / fps}
+                                 for begin, end in fragments]}, result_file, indent=4)
+
+    return {"result": result_path, "fragments": len(fragments), "frames": frames_number,
+            "analysis_time": time.time() - starting_point}
+
+
+def load_manifest(manifest_path):
+    if not os.path.exists(manifest_path):
+        return {"files": {}}
+    with open(manifest_path) as manifest_file:
+        return json.load(manifest_file)
+
+
+def save_manifest(manifest, manifest_path):
+    # the manifest is replaced at once, so an interrupted batch never leaves it broken
+    temporary_path = manifest_path + ".tmp"
+    with open(temporary_path, "w") as manifest_file:
+        json.dump(manifest, manifest_file, indent=4)
+    os.replace(temporary_path, manifest_path)
+
+
+def is_completed(entry, video_path, parameters_values):
+    # a file is analysed again when it or analysis parameters have changed
+    return entry is not None and entry.get("status") == STATUS_COMPLETED \
+        and entry.get("parameters") == parameters_values and entry.get("file") == get_file_state(video_path)
+
+
+def save_results(results_database, video_path, result_path, parameters_values):
+    # fragments found by a worker are added to the results database by the main process
+    with open(result_path) as result_file:
+        result = json.load(result_file)
+    video_id = results_database.add_video(video_path, AnalysisIndex().increment(video_path), result["fps"],
+                                          result["frames"], result.get("tagged_date"), parameters_values)
+    results_database.save_fragments(video_id, [(fragment_index, fragment["begin_frame"], fragment["end_frame"])
+                                               for fragment_index, fragment in enumerate(result["fragments"])])
+
+
+def run_batch(patterns, parameters, workers, manifest_path, output_directory, progress_callback=None,
+              results_database=None, is_running=None):
+    # progress callback is called with video path and its manifest entry after every finished file,
+    # when is_running returns False, files not started yet are cancelled and the batch can be resumed later
+    os.makedirs(output_directory, exist_ok=True)
+    parameters_values = parameters.as_dict()
+    manifest = load_manifest(manifest_path)
+    videos = find_videos(patterns)
+    waiting = [video_path for video_path in videos
+               if not is_completed(manifest["files"].get(video_path), video_path, parameters_values)]
+
+    interrupted = False
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers, initializer=restore_interrupt_handler) \
+            as executor:
+        futures = {executor.submit(analyse_file, video_path, parameters_values, output_directory): video_path
+                   for video_path in waiting}
+        not_done = set(futures)
+        while len(not_done) > 0:
+            done, not_done = concurrent.futures.wait(not_done, timeout=STOP_CHECK_INTERVAL,
+                                                     return_when=concurrent.futures.FIRST_COMPLETED)
+            if is_running is not None and not is_running():
+                interrupted = True
+
+            for future in done:
+                if future.cancelled():
+                    continue
+
+                video_path = futures[future]
+                entry = {"parameters": parameters_values, "file": get_file_state(video_path),
+                         "finished": time.time()}
+                try:
+                    entry.update(future.result())
+                    entry["status"] = STATUS_COMPLETED
+                    if results_database is not None:
+                        save_results(results_database, video_path, entry["result"], parameters_values)
+                except KeyboardInterrupt:
+                    # Ctrl+C has reached the worker, the file is analysed again when the batch is resumed
+                    interrupted = True
+                    continue
+                except Exception as e:
+                    if interrupted:
+                        # e.g. a worker stopped by Ctrl+C while waiting for a file
+                        continue
+                    # a broken file does not stop the rest of the batch
+                    entry["status"] = STATUS_FAILED
+                    entry["error"] = repr(e)
+
+                manifest["files"][video_path] = entry
+                save_manifest(manifest, manifest_path)
+                if progress_callback is not None:
+                    progress_callback(video_path, entry)
+
+            if interrupted:
+                for future in not_done:
+                    future.cancel()
+
+    save_manifest(manifest, manifest_path)
+    return len(videos), len(videos) - len(waiting)
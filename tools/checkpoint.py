@@ -0,0 +1,116 @@
+import json
+import os
+
+from .timeline import MotionTimeline
+from .video_index import get_file_state
+
+CHECKPOINT_VERSION = 1
+
+
+def get_checkpoint_path(video_path):
+    return video_path[0: video_path.rfind("."):] + "_checkpoint.json"
+
+
+def get_checkpoint_timeline_path(video_path):
+    return video_path[0: video_path.rfind("."):] + "_checkpoint_timeline.npy"
+
+
+def save_checkpoint(video_path, parameters_values, position, analyser_state, progress, timeline=None):
+    # position is the number of frames already analysed, progress contains results gathered
+    # by the caller (e.g. found fragments) and is given back unchanged when analysis is resumed
+    checkpoint = {
+        "version": CHECKPOINT_VERSION,
+        "file": get_file_state(video_path),
+        "parameters": parameters_values,
+        "position": position,
+        "analyser": analyser_state,
+        "progress": progress
+    }
+
+    if timeline is not None:
+        timeline_path = get_checkpoint_timeline_path(video_path)
+        # np.save adds extension to names without it, so the temporary file keeps it
+        temporary_timeline_path = timeline_path[:-len(".npy")] + "_tmp.npy"
+        timeline.save(temporary_timeline_path)
+        os.replace(temporary_timeline_path, timeline_path)
+
+    # the checkpoint is replaced at once, so the previous one stays valid if writing is interrupted
+    checkpoint_path = get_checkpoint_path(video_path)
+    temporary_path = checkpoint_path + ".tmp"
+    with open(temporary_path, "w") as checkpoint_file:
+        json.dump(checkpoint, checkpoint_file)
+    os.replace(temporary_path, checkpoint_path)
+
+
+def can_save_checkpoint(analyser, sampler=None):
+    # skipped frames have to be read again after motion appears, so analysis with
+    # the sampler can be interrupted only when it is not going back
+    if sampler is None:
+        return True
+    return analyser.is_idle() and analyser.get_state()["frame_counter"] == sampler.position
+
+
+def get_checkpoint_state(analyser):
+    # fragments already sent to object detection are not saved in the checkpoint, so their detection
+    # is finished before the state is taken and nothing is lost when analysis is interrupted afterwards
+    analyser.wait_for_detection()
+    return analyser.get_state()
+
+
+def load_checkpoint(video_path, parameters_values):
+    # returns None when there is no checkpoint or it cannot be used for the video and parameters
+    checkpoint_path = get_checkpoint_path(video_path)
+    if not os.path.exists(checkpoint_path):
+        return None
+
+    try:
+        with open(checkpoint_path) as checkpoint_file:
+            checkpoint = json.load(checkpoint_file)
+    except ValueError:
+        print("Checkpoint {} is damaged".format(checkpoint_path))
+        return None
+
+    if checkpoint.get("version") != CHECKPOINT_VERSION:
+        print("Checkpoint {} has been saved by a different version".format(checkpoint_path))
+        return None
+    if checkpoint["file"] != get_file_state(video_path):
+        print("Video has changed since checkpoint {} was saved".format(checkpoint_path))
+        return None
+    if checkpoint["parameters"] != parameters_values:
+        print("Checkpoint {} has been saved with different parameters".format(checkpoint_path))
+        return None
+
+    return checkpoint
+
+
+def remove_checkpoint(video_path):
+    for path in (get_checkpoint_path(video_path), get_checkpoint_timeline_path(video_path)):
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def resume_analysis(video_path, video_capture, analyser, checkpoint, warmup_frames):
+    # background model is rebuilt on frames preceding the checkpoint, then motion state is restored
+    # and the video is left at the first frame which has not been analysed yet,
+    # frames waiting for object detection are read again without motion boxes and status drawn on them
+    state = checkpoint["analyser"]
+    frames_to_detect = [video_capture.get_frame_by_index(index - 1)[1] for index, _, _ in state["frames_to_detect"]]
+
+    position = checkpoint["position"]
+    warmup_begin = max(0, position - warmup_frames)
+    video_capture.set_frame(warmup_begin)
+    analyser.start_at(warmup_begin)
+    for _ in range(position - warmup_begin):
+        ret, frame = video_capture.get_frame()
+        if not ret:
+            break
+        analyser.warm_up(frame)
+
+    timeline = MotionTimeline.load(get_checkpoint_timeline_path(video_path))
+    if timeline is not None:
+        # in pipeline mode motion analysis can be ahead of the checkpoint
+        records = timeline.records
+        timeline = MotionTimeline(records[records["frame"] <= state["frame_counter"]])
+    analyser.restore_state(state, frames_to_detect, timeline)
+    video_capture.set_frame(position)
+    return position
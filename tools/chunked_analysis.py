@@ -0,0 +1,116 @@
+import concurrent.futures
+import math
+
+import numpy as np
+
+from gui.video_capture import VideoCapture
+from .analyse import Analyser
+from .batch_analysis import STOP_CHECK_INTERVAL, restore_interrupt_handler
+from .parameters import Parameters
+from .timeline import MotionTimeline
+
+
+def split_into_chunks(frames_number, chunks_number):
+    chunk_length = max(1, int(math.ceil(frames_number / chunks_number)))
+    return [(begin, min(begin + chunk_length, frames_number)) for begin in range(0, frames_number, chunk_length)]
+
+
+def analyse_chunk(video_path, parameters_values, begin, end, warmup_frames):
+    # begin and end are positions in the video (counted from 0), fragments are returned in the frame
+    # indices used by Analyser (counted from 1), so they can be compared with a sequential run
+    parameters = Parameters()
+    parameters.update_from_dict(parameters_values)
+    video_capture = VideoCapture(video_path, parameters)
+
+    warmup_begin = max(0, begin - warmup_frames)
+    video_capture.set_frame(warmup_begin)
+    analyser = Analyser(parameters, None, show_preview=False)
+    analyser.start_at(warmup_begin)
+
+    # fragment in progress at the end of the chunk is followed until motion stops,
+    # but no longer than the chunk itself
+    overrun_end = end + (end - begin)
+    position = warmup_begin
+    fragments = []
+    fragment_begin = None
+
+    ret, frame = video_capture.get_frame()
+    while ret:
+        _, motion_detected, return_frame_index = analyser.analyse_frame(frame, perform_object_detection=False)
+        position += 1
+
+        if motion_detected and fragment_begin is None:
+            fragment_begin = return_frame_index
+        elif not motion_detected and fragment_begin is not None and return_frame_index is not None:
+            fragments.append([fragment_begin, return_frame_index])
+            fragment_begin = None
+
+        if position >= end and (analyser.is_idle() or position >= overrun_end):
+            break
+
+        ret, frame = video_capture.get_frame()
+
+    if fragment_begin is not None:
+        fragments.append([fragment_begin, position])
+
+    video_capture.release_video()
+
+    records = None
+    if analyser.get_timeline() is not None:
+        records = analyser.get_timeline().records
+        records = records[(records["frame"] > begin) & (records["frame"] <= end)]
+
+    return clip_fragments(fragments, begin + 1), records
+
+
+def clip_fragments(fragments, first_frame):
+    # motion found during warm-up belongs to the previous chunk
+    return [[max(begin, first_frame), end] for begin, end in fragments if end >= first_frame]
+
+
+def merge_chunk_fragments(chunks_fragments, max_break_length):
+    merged = []
+    for chunk_fragments in chunks_fragments:
+        for fragment_number, (begin, end) in enumerate(chunk_fragments):
+            if merged:
+                overlapping = begin <= merged[-1][1]
+                continued = fragment_number == 0 and begin - merged[-1][1] <= max_break_length
+                if overlapping or continued:
+                    merged[-1][1] = max(merged[-1][1], end)
+                    continue
+
+            merged.append([begin, end])
+
+    return merged
+
+
+def analyse_in_chunks(video_path, parameters, workers, warmup_frames, is_running=None):
+    # returns None instead of fragments when is_running returns False before all chunks are analysed
+    video_capture = VideoCapture(video_path, parameters)
+    frames_number = int(video_capture.get_frames_num())
+    video_capture.release_video()
+
+    chunks = split_into_chunks(frames_number, workers)
+    parameters_values = parameters.as_dict()
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers, initializer=restore_interrupt_handler) \
+            as executor:
+        futures = [executor.submit(analyse_chunk, video_path, parameters_values, begin, end, warmup_frames)
+                   for begin, end in chunks]
+        not_done = futures
+        while len(not_done) > 0:
+            _, not_done = concurrent.futures.wait(not_done, timeout=STOP_CHECK_INTERVAL)
+            if is_running is not None and not is_running():
+                # chunks already being analysed are stopped by Ctrl+C in their workers
+                for future in not_done:
+                    future.cancel()
+                concurrent.futures.wait(not_done)
+                return None, None
+        results = [future.result() for future in futures]
+
+    chunks_fragments = [fragments for fragments, _ in results]
+    timeline = None
+    if parameters.record_timeline and len(results) > 0:
+        timeline = MotionTimeline(np.concatenate([records for _, records in results]))
+
+    return merge_chunk_fragments(chunks_fragments, parameters.max_break_length), timeline
@@ -0,0 +1,133 @@
+import bisect
+import json
+import threading
+import time
+
+# upper bounds of histogram buckets in seconds, from 10 us to 10 s in half decade steps
+BUCKET_BOUNDS = [10 ** (exponent / 2) for exponent in range(-10, 3)]
+
+
+class Histogram:
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.minimum = None
+        self.maximum = None
+        # the last bucket gathers values above the last bound
+        self.buckets = [0] * (len(BUCKET_BOUNDS) + 1)
+
+    def add(self, value):
+        self.count += 1
+        self.total += value
+        if self.minimum is None or value < self.minimum:
+            self.minimum = value
+        if self.maximum is None or value > self.maximum:
+            self.maximum = value
+        self.buckets[bisect.bisect_left(BUCKET_BOUNDS, value)] += 1
+
+    def get_percentile(self, percentile):
+        # approximated by the upper bound of the bucket containing the percentile
+        if self.count == 0:
+            return None
+
+        needed = percentile / 100 * self.count
+        gathered = 0
+        for bucket_index, bucket_count in enumerate(self.buckets):
+            gathered += bucket_count
+            if gathered >= needed and bucket_count > 0:
+                if bucket_index < len(BUCKET_BOUNDS):
+                    return min(BUCKET_BOUNDS[bucket_index], self.maximum)
+                return self.maximum
+
+        return self.maximum
+
+    def as_dict(self):
+        bucket_names = ["<={:g}".format(bound) for bound in BUCKET_BOUNDS] + [">{:g}".format(BUCKET_BOUNDS[-1])]
+        return {
+            "count": self.count,
+            "total": self.total,
+            "mean": self.total / self.count if self.count > 0 else None,
+            "min": self.minimum,
+            "max": self.maximum,
+            "p50": self.get_percentile(50),
+            "p95": self.get_percentile(95),
+            "buckets": {name: count for name, count in zip(bucket_names, self.buckets) if count > 0}
+        }
+
+
+class Timer:
+    __slots__ = ("_metrics", "_name", "_start")
+
+    def __init__(self, metrics, name):
+        self._metrics = metrics
+        self._name = name
+        self._start = None
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._metrics.record(self._name, time.perf_counter() - self._start)
+        return False
+
+
+# Durations of analysis stages gathered as histograms and numbers of processed items gathered as counters.
+# Stages are measured by wrapping them in timer, e.g. "with metrics.timer("analysis.blur"):".
+# Recording takes a few microseconds, which is negligible compared to processing of a frame,
+# so it is always enabled.
+class Metrics:
+    def __init__(self):
+        self.enabled = True
+        self._histograms = {}
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def timer(self, name):
+        return Timer(self, name)
+
+    def record(self, name, duration):
+        if not self.enabled:
+            return
+
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._histograms[name] = Histogram()
+            histogram.add(duration)
+
+    def increment(self, name, value=1):
+        if not self.enabled:
+            return
+
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def get_histogram(self, name):
+        with self._lock:
+            histogram = self._histograms.get(name)
+            return histogram.as_dict() if histogram is not None else None
+
+    def get_counter(self, name):
+        with self._lock:
+            return self._counters.get(name, 0)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "stages": {name: histogram.as_dict() for name, histogram in sorted(self._histograms.items())},
+                "counters": dict(sorted(self._counters.items()))
+            }
+
+    def dump(self, path):
+        with open(path, "w") as metrics_file:
+            json.dump(self.snapshot(), metrics_file, indent=4)
+
+    def reset(self):
+        with self._lock:
+            self._histograms = {}
+            self._counters = {}
+
+
+# shared by all analysers, video captures and detectors of the process
+metrics = Metrics()
@@ -0,0 +1,116 @@
+import os
+import threading
+import time
+
+import misc.defaults as defaults
+from gui.video_capture import VideoCapture
+from .analyse import Analyser
+from .instrumentation import metrics
+from .live_capture import LiveCapture
+from .parameters import Parameters
+
+
+def parse_source(source):
+    # device indices are given as numbers, anything else is a path to a video file
+    return int(source) if source.isdigit() else source
+
+
+# Analyses one camera in its own thread, several sources share one object detector. Video files
+# can be used instead of cameras, they are played in real time. Frames are grabbed by LiveCapture,
+# when analysis is slower than the source, late frames are dropped, so analysis stays real-time.
+class LiveSource:
+    def __init__(self, source, parameters_values, detector, on_motion=None, name=None,
+                 latency_budget=defaults.LIVE_LATENCY_BUDGET):
+        self.source = source
+        if name is None:
+            name = "camera {}".format(source) if isinstance(source, int) else os.path.basename(source)
+        # name identifies the source in reports and in the shared detector, so it has to be unique
+        self.name = name
+        self._is_device = isinstance(source, int)
+
+        parameters = Parameters()
+        parameters.update_from_dict(parameters_values)
+        self._video_capture = VideoCapture(source, parameters)
+        self._live_capture = LiveCapture(self._video_capture, self._is_device, latency_budget=latency_budget)
+        self._fps = self._live_capture.get_fps()
+        self._analyser = Analyser(parameters, detector, show_preview=False, source=self.name)
+        # called with the source, whether motion is detected and time of the change in seconds
+        self._on_motion = on_motion
+
+        self._running = False
+        self._thread = None
+        self._error = None
+        self._start_time = None
+        self._end_time = None
+        self._analysed_frames = 0
+        self._total_latency = 0
+        self._max_latency = 0
+
+    def start(self):
+        self._running = True
+        self._start_time = time.time()
+        self._thread = threading.Thread(target=self.__run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def is_running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def get_error(self):
+        return self._error
+
+    def get_statistics(self):
+        end_time = self._end_time if self._end_time is not None else time.time()
+        elapsed = max(end_time - self._start_time, 1e-6) if self._start_time is not None else 1e-6
+        capture_statistics = self._live_capture.get_statistics()
+
+        return {
+            "source_fps": self._fps,
+            "fps": self._analysed_frames / elapsed,
+            "analysed_frames": self._analysed_frames,
+            "dropped_frames": capture_statistics["dropped_frames"],
+            "mean_latency": self._total_latency / max(self._analysed_frames, 1),
+            "max_latency": self._max_latency,
+            "elapsed": elapsed
+        }
+
+    def __update_latency(self):
+        # time from grabbing the frame to the end of its analysis, motion is reported right after it
+        latency = time.time() - self._live_capture.timestamp
+        metrics.record("live.latency", latency)
+        self._total_latency += latency
+        self._max_latency = max(self._max_latency, latency)
+
+    def __run(self):
+        already_moving = False
+        self._live_capture.start()
+        try:
+            while self._running:
+                ret, frame = self._live_capture.get_frame()
+                if not ret:
+                    break
+
+                # frame indices are kept equal to positions in the source also when frames are dropped
+                self._analyser.set_frame_counter(self._live_capture.position - 1)
+                _, motion_detected, return_frame_index = self._analyser.analyse_frame(frame)
+                self._analysed_frames += 1
+                self.__update_latency()
+                if motion_detected != already_moving and return_frame_index is not None:
+                    already_moving = motion_detected
+                    if self._on_motion is not None:
+                        self._on_motion(self, motion_detected, return_frame_index / self._fps)
+        except Exception as e:
+            self._error = e
+        finally:
+            self._end_time = time.time()
+            self._live_capture.stop()
+            if already_moving:
+                self._analyser.run_object_analysis()
+                if self._on_motion is not None:
+                    self._on_motion(self, False, self._live_capture.position / self._fps)
+            self._video_capture.release_video()
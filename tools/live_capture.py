@@ -0,0 +1,130 @@
+import collections
+import threading
+import time
+
+import misc.defaults as defaults
+from .instrumentation import metrics
+
+# how often waiting for a frame checks whether the capture has been stopped, in seconds
+STOP_CHECK_INTERVAL = 0.1
+# pause after a camera failed to deliver a frame, in seconds
+RETRY_DELAY = 0.01
+
+CapturedFrame = collections.namedtuple("CapturedFrame", ["position", "timestamp", "frame"])
+
+
+# Reads frames from a camera in its own thread, so frames never wait in the capture buffer.
+# Only a few newest frames are kept and frames older than the latency budget are dropped,
+# so analysis which does not keep up works on recent frames instead of falling behind.
+# Positions of frames are counted also for dropped ones, so they still correspond to time.
+# Video files can be used instead of cameras, they are read in real time.
+class LiveCapture:
+    def __init__(self, video_capture, is_device, ring_size=defaults.LIVE_RING_SIZE,
+                 latency_budget=defaults.LIVE_LATENCY_BUDGET):
+        self._video_capture = video_capture
+        self._is_device = is_device
+        self._fps = video_capture.get_fps() or defaults.LIVE_DEFAULT_FPS
+        self._latency_budget = latency_budget
+        self._frames = collections.deque(maxlen=max(1, ring_size))
+        self._condition = threading.Condition()
+
+        self._running = False
+        self._finished = False
+        self._thread = None
+        self._start_time = None
+
+        self._grabbed_frames = 0
+        self._dropped_frames = 0
+        self._position = 0
+        self._timestamp = None
+
+    @property
+    def position(self):
+        # position of the last returned frame, counted from 1
+        return self._position
+
+    @property
+    def timestamp(self):
+        # time when the last returned frame was captured
+        return self._timestamp
+
+    def get_fps(self):
+        return self._fps
+
+    def start(self):
+        self._running = True
+        self._start_time = time.time()
+        self._thread = threading.Thread(target=self.__grab, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+        with self._condition:
+            self._condition.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def get_frame(self, timeout=None):
+        # returns the oldest frame which is not late, waits for a new frame if there is none,
+        # ret is False when the capture ended, has been stopped or no frame came in timeout
+        deadline = time.time() + timeout if timeout is not None else None
+        with self._condition:
+            while len(self._frames) == 0:
+                if self._finished or not self._running:
+                    return False, None
+                if deadline is not None and time.time() >= deadline:
+                    return False, None
+                self._condition.wait(STOP_CHECK_INTERVAL)
+
+            now = time.time()
+            while len(self._frames) > 1 and now - self._frames[0].timestamp > self._latency_budget:
+                self._frames.popleft()
+                self.__count_dropped_frame()
+
+            captured_frame = self._frames.popleft()
+
+        self._position = captured_frame.position
+        self._timestamp = captured_frame.timestamp
+        return True, captured_frame.frame
+
+    def get_statistics(self):
+        with self._condition:
+            return {"grabbed_frames": self._grabbed_frames, "dropped_frames": self._dropped_frames}
+
+    def __count_dropped_frame(self):
+        self._dropped_frames += 1
+        metrics.increment("live.dropped_frames")
+
+    def __wait_for_frame(self, position):
+        # video files are not read faster than they would be recorded
+        delay = self._start_time + position / self._fps - time.time()
+        if delay > 0:
+            time.sleep(delay)
+
+    def __grab(self):
+        position = 0
+        while self._running:
+            if not self._is_device:
+                self.__wait_for_frame(position)
+
+            ret, frame = self._video_capture.get_frame()
+            if not ret:
+                if self._is_device and self._running:
+                    # cameras sometimes fail to deliver a single frame
+                    time.sleep(RETRY_DELAY)
+                    continue
+                break
+
+            position += 1
+            with self._condition:
+                self._grabbed_frames += 1
+                if len(self._frames) == self._frames.maxlen:
+                    # the oldest frame is replaced by the new one
+                    self.__count_dropped_frame()
+                self._frames.append(CapturedFrame(position, time.time(), frame))
+                self._condition.notify()
+
+        with self._condition:
+            self._finished = True
+            self._condition.notify_all()
@@ -0,0 +1,6 @@
+from .video_index import get_video_info
+
+
+def get_tagged_date(path):
+    # moment when the recording has been finished (e.g. "UTC 2013-08-15 14:31:51"), None when it is unknown
+    return get_video_info(path)["tagged_date"]
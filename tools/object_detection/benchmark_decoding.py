@@ -0,0 +1,78 @@
+import argparse
+import time
+
+import numpy as np
+
+from .cfg import parameters_detection
+from .decoding import decode_outputs
+
+# numbers of rows in output layers of YOLOv3 for 416 x 416 input
+LAYER_ROWS = (13 * 13 * 3, 26 * 26 * 3, 52 * 52 * 3)
+CLASSES = 80
+
+
+# previous implementation of decoding, kept as a reference for comparison
+def decode_outputs_loop(layer_outputs, width, height, confidence_threshold):
+    boxes = []
+    confidences = []
+    class_ids = []
+    for output in layer_outputs:
+        for detection in output:
+            scores = detection[5:]
+            class_id = np.argmax(scores)
+            confidence = scores[class_id]
+            if confidence > confidence_threshold:
+                box = detection[0:4] * np.array([width, height, width, height])
+                (center_x, center_y, box_width, box_height) = box.astype("int")
+                x = int(center_x - (box_width / 2))
+                y = int(center_y - (box_height / 2))
+                boxes.append([x, y, int(box_width), int(box_height)])
+                confidences.append(float(confidence))
+                class_ids.append(class_id)
+
+    return boxes, confidences, class_ids
+
+
+def generate_outputs(random_generator, objects_fraction):
+    # scores of real outputs are almost all close to zero, only few rows describe detected objects
+    layer_outputs = []
+    for rows in LAYER_ROWS:
+        output = np.zeros((rows, 5 + CLASSES), dtype=np.float32)
+        output[:, 0:4] = random_generator.random((rows, 4), dtype=np.float32)
+        output[:, 5:] = random_generator.random((rows, CLASSES), dtype=np.float32) * 0.1
+        objects = random_generator.random(rows) < objects_fraction
+        output[objects, 5 + random_generator.integers(0, CLASSES, objects.sum())] = 0.9
+        layer_outputs.append(output)
+
+    return layer_outputs
+
+
+def measure(function, layer_outputs, repeats):
+    start = time.perf_counter()
+    for _ in range(repeats):
+        result = function(layer_outputs, 640, 480, parameters_detection.CONFIDENCE)
+    return (time.perf_counter() - start) / repeats, result
+
+
+def main():
+    argparser = argparse.ArgumentParser(description="Comparison of YOLO output decoding implementations")
+    argparser.add_argument("-repeats", type=int, default=20, help="Number of decoded frames")
+    argparser.add_argument("-objects", type=float, default=0.001, help="Fraction of rows with detected objects")
+    args = argparser.parse_args()
+
+    layer_outputs = generate_outputs(np.random.default_rng(0), args.objects)
+
+    loop_time, (loop_boxes, loop_confidences, loop_class_ids) = measure(decode_outputs_loop, layer_outputs,
+                                                                       args.repeats)
+    vectorised_time, (boxes, confidences, class_ids) = measure(decode_outputs, layer_outputs, args.repeats)
+
+    same_results = boxes.tolist() == loop_boxes and confidences.tolist() == loop_confidences \
+        and class_ids.tolist() == loop_class_ids
+    print("Rows per frame: {}, detections above threshold: {}".format(sum(LAYER_ROWS), len(loop_boxes)))
+    print("Loop decoding: {:.2f} ms per frame".format(loop_time * 1000))
+    print("Vectorised decoding: {:.2f} ms per frame".format(vectorised_time * 1000))
+    print("Speedup: {:.1f}x, same results: {}".format(loop_time / vectorised_time, same_results))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,24 @@
+import numpy as np
+
+
+def decode_outputs(layer_outputs, width, height, confidence_threshold):
+    # all rows of all output layers are processed at once, every row consists of
+    # center (x, y), width and height of the box relative to the image, objectness
+    # score and scores of all classes
+    outputs = np.concatenate([np.asarray(output).reshape(-1, output.shape[-1]) for output in layer_outputs])
+    scores = outputs[:, 5:]
+    class_ids = np.argmax(scores, axis=1)
+    confidences = scores[np.arange(len(scores)), class_ids]
+
+    # filter out weak predictions before any further computation
+    mask = confidences > confidence_threshold
+    class_ids = class_ids[mask]
+    confidences = confidences[mask]
+
+    # scale boxes back relative to the size of the image and derive top left
+    # corners from centers
+    boxes = (outputs[mask, 0:4] * np.array([width, height, width, height])).astype("int")
+    boxes[:, 0] = (boxes[:, 0] - boxes[:, 2] / 2).astype("int")
+    boxes[:, 1] = (boxes[:, 1] - boxes[:, 3] / 2).astype("int")
+
+    return boxes, confidences.astype(float), class_ids
@@ -0,0 +1,39 @@
+import collections
+
+from tools.signatures import hamming_distance
+
+
+# Remembers objects found on recently detected frames, so frames similar to them
+# do not need to be passed to the network again
+class DetectionCache:
+    def __init__(self, capacity):
+        self._capacity = capacity
+        self._entries = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, signature, max_distance, queued_signatures=()):
+        # returns labels of a similar cached frame, empty list if a similar frame is already queued
+        # for detection (its objects will be found anyway) or None if the frame needs detection
+        for cached_signature, labels in self._entries.items():
+            if hamming_distance(signature, cached_signature) <= max_distance:
+                self._entries.move_to_end(cached_signature)
+                self.hits += 1
+                return labels
+
+        for queued_signature in queued_signatures:
+            if hamming_distance(signature, queued_signature) <= max_distance:
+                self.hits += 1
+                return []
+
+        self.misses += 1
+        return None
+
+    def add(self, signature, labels):
+        self._entries[signature] = labels
+        self._entries.move_to_end(signature)
+        while len(self._entries) > self._capacity:
+            self._entries.popitem(last=False)
+
+    def get_statistics(self):
+        return {"hits": self.hits, "misses": self.misses}
@@ -1,174 +1,344 @@
+import collections
+import concurrent.futures
+import queue
 import cv2
 import numpy as np
-import time
-import yaml
+import misc.defaults as defaults
+from tools.instrumentation import metrics
 from .cfg import parameters_detection
+from .decoding import decode_outputs
+from .detection_cache import DetectionCache
 import threading
-from _datetime import datetime
-from _datetime import timedelta
 
 
-class ObjectDetector:
-    def __init__(self, app):
-        self.frames = None
-        self.frame = None
-        self.app = app
+CONFIG_PATH = "tools/object_detection/cfg/yolov3.cfg"
+WEIGHTS_PATH = "tools/object_detection/weights/yolov3.weights"
+LABELS_PATH = "tools/object_detection/data/coco.names"
+
+# every worker thread (or process) keeps its own network, so they do not wait for each other
+_worker_data = threading.local()
+
 
+class YoloNetwork:
+    def __init__(self):
         # the neural network configuration
-        self.config_path = "tools/object_detection/cfg/yolov3.cfg"
+        self.config_path = CONFIG_PATH
         # the YOLO net weights file
-        self.weights_path = "tools/object_detection/weights/yolov3.weights"
+        self.weights_path = WEIGHTS_PATH
         # weights_path = "weights/yolov3-tiny.weights"
 
         # loading all the class labels (objects)
-        self.labels = open("tools/object_detection/data/coco.names").read().strip().split("\n")
+        self.labels = open(LABELS_PATH).read().strip().split("\n")
         # generating colors for each object for later plotting
         self.colors = np.random.randint(0, 255, size=(len(self.labels), 3), dtype="uint8")
 
         # load the YOLO network
         self.net = cv2.dnn.readNetFromDarknet(self.config_path, self.weights_path)
         self.ln = self.net.getLayerNames()
-        self.ln = [self.ln[i[0] - 1] for i in self.net.getUnconnectedOutLayers()]
+        # depending on OpenCV version indices are given as a flat array or as a column
+        self.ln = [self.ln[i - 1] for i in np.array(self.net.getUnconnectedOutLayers()).flatten()]
 
-        self.vs = None
-        self.writer = None
-        self.W = None
-        self.H = None
-        self.prop = None
-        self.total = None
+    def detect(self, frames, batch_size=1):
+        # returns list of detections for every frame, detected objects are also marked on frames
+        detections = []
 
-        # CUDA = torch.cuda.is_available()
+        for batch_begin in range(0, len(frames), batch_size):
+            batch = frames[batch_begin:batch_begin + batch_size]
 
-        self._lock = threading.Lock()
+            # construct a blob from the input frames and then perform a forward
+            # pass of the YOLO object detector, giving us our bounding boxes
+            # and associated probabilities
+            with metrics.timer("detection.blob"):
+                blob = cv2.dnn.blobFromImages(batch, 1 / 255.0, (416, 416),
+                                              swapRB=True, crop=False)
+            self.net.setInput(blob)
+            with metrics.timer("detection.forward"):
+                layerOutputs = self.net.forward(self.ln)
+            metrics.increment("detection.batches")
+            metrics.increment("detection.images", len(batch))
 
-    def upload_frame(self, frame):
-        self.frame = frame
+            for frame_number, frame in enumerate(batch):
+                frame_outputs = [self.__get_frame_output(output, frame_number, len(batch))
+                                 for output in layerOutputs]
+                detections.append(self.__process_outputs(frame, frame_outputs))
 
-    def upload_frames(self, frames):
-        self.frames = frames
+        return detections
 
-    def detect_objects(self, frames, index):
-        with self._lock:
-            found_objects = []
-
-            self.upload_frames(frames)
-            for frame in self.frames:
-                self.frame = frame
-                # if the frame dimensions are empty, grab them
-                if self.W is None or self.H is None:
-                    (self.H, self.W) = self.frame.shape[:2]
-
-                # construct a blob from the input frame and then perform a forward
-                # pass of the YOLO object detector, giving us our bounding boxes
-                # and associated probabilities
-                blob = cv2.dnn.blobFromImage(self.frame, 1 / 255.0, (416, 416),
-                                             swapRB=True, crop=False)
-                self.net.setInput(blob)
-                start = time.time()
-                layerOutputs = self.net.forward(self.ln)
-                end = time.time()
-                # initialize our lists of detected bounding boxes, confidences,
-                # and class IDs, respectively
-                boxes = []
-                confidences = []
-                classIDs = []
-                # loop over each of the layer outputs
-                for output in layerOutputs:
-                    # loop over each of the detections
-                    for detection in output:
-                        # extract the class ID and confidence (i.e., probability)
-                        # of the current object detection
-                        scores = detection[5:]
-                        classID = np.argmax(scores)
-                        confidence = scores[classID]
-                        # filter out weak predictions by ensuring the detected
-                        # probability is greater than the minimum probability
-                        if confidence > parameters_detection.CONFIDENCE:
-                            # scale the bounding box coordinates back relative to
-                            # the size of the image, keeping in mind that YOLO
-                            # actually returns the center (x, y)-coordinates of
-                            # the bounding box followed by the boxes' width and
-                            # height
-                            box = detection[0:4] * np.array([self.W, self.H, self.W, self.H])
-                            (centerX, centerY, width, height) = box.astype("int")
-                            # use the center (x, y)-coordinates to derive the top
-                            # and and left corner of the bounding box
-                            x = int(centerX - (width / 2))
-                            y = int(centerY - (height / 2))
-                            # update our list of bounding box coordinates,
-                            # confidences, and class IDs
-                            boxes.append([x, y, int(width), int(height)])
-                            confidences.append(float(confidence))
-                            classIDs.append(classID)
-                # apply non-maxima suppression to suppress weak, overlapping
-                # bounding boxes
-                idxs = cv2.dnn.NMSBoxes(boxes, confidences, parameters_detection.CONFIDENCE,
-                                        parameters_detection.SCORE_THRESHOLD)
-                # ensure at least one detection exists
-                if len(idxs) > 0:
-                    # loop over the indexes we are keeping
-                    for i in idxs.flatten():
-                        # extract the bounding box coordinates
-                        (x, y) = (boxes[i][0], boxes[i][1])
-                        (w, h) = (boxes[i][2], boxes[i][3])
-                        # draw a bounding box rectangle and label on the frame
-                        color = [int(c) for c in self.colors[classIDs[i]]]
-                        cv2.rectangle(self.frame, (x, y), (x + w, y + h), color, 2)
-                        text = "{}: {:.4f}".format(self.labels[classIDs[i]],
-                                                   confidences[i])
-                        if not (self.labels[classIDs[i]] in found_objects):
-                            found_objects.append(self.labels[classIDs[i]])
-
-                        cv2.putText(self.frame, text, (x, y - 5),
-                                    cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 2)
-
-                elap = (end - start)
-                print("[INFO] single frame took {:.4f} seconds".format(elap))
-
-            if len(frames) > 0:
-                self._save(index, found_objects)
-            # print("FINISHED " + str(index) )
-
-    # time.strftime("%H:%M:%S", time.gmtime(self.moving_list[0]))
-
-    def _save(self, index, objects):
-        path = self.app.path
-        with open("./analyse_stat.yaml") as stat_file:
-            analysed_files = yaml.load(stat_file, Loader=yaml.FullLoader)
-        analyse_index = analysed_files.get(path)
-        path = path[0: path.rfind("."):] + "_annotations_" + str(analyse_index) + ".txt"
-        if self.app.video_tagged_date is not None:
-            # UTC 2013-08-15 14:31:51
-            try:
-                start = datetime.strptime(self.app.video_tagged_date, '%Z %Y-%m-%d %H:%M:%S') \
-                        + timedelta(seconds=int(self.app.get_moving_times(index)[0])) - timedelta(seconds=int(
-                    self.app.video_source.get_frames_num() / self.app.video_source.get_fps()))
-                end = datetime.strptime(self.app.video_tagged_date, '%Z %Y-%m-%d %H:%M:%S') \
-                      + timedelta(seconds=int(self.app.get_moving_times(index)[1])) - timedelta(seconds=int(
-                    self.app.video_source.get_frames_num() / self.app.video_source.get_fps()))
-            except IndexError:
-                print("Wrong index")
-            except TypeError:
-                print("Wrong type detected")
-
-            f = open(path, "a")
-            f.write(str(start) + " - " + str(end) + ": ")
-            for o in objects:
-                f.write(o + " ")
-            f.write(" \n")
-            f.close()
+    @staticmethod
+    def __get_frame_output(output, frame_number, batch_size):
+        # depending on OpenCV version outputs for a batch are stacked in a separate
+        # dimension or concatenated along the detections
+        if output.ndim == 3:
+            return output[frame_number]
+        rows = output.shape[0] // batch_size
+        return output[frame_number * rows:(frame_number + 1) * rows]
+
+    def __process_outputs(self, frame, layerOutputs):
+        (H, W) = frame.shape[:2]
+        detections = []
+
+        with metrics.timer("detection.decoding"):
+            boxes, confidences, classIDs = decode_outputs(layerOutputs, W, H, parameters_detection.CONFIDENCE)
+            boxes = boxes.tolist()
+            confidences = confidences.tolist()
+
+        # apply non-maxima suppression to suppress weak, overlapping
+        # bounding boxes
+        with metrics.timer("detection.nms"):
+            idxs = cv2.dnn.NMSBoxes(boxes, confidences, parameters_detection.CONFIDENCE,
+                                    parameters_detection.SCORE_THRESHOLD)
+        # ensure at least one detection exists
+        if len(idxs) > 0:
+            # loop over the indexes we are keeping
+            for i in np.array(idxs).flatten():
+                # extract the bounding box coordinates
+                (x, y) = (boxes[i][0], boxes[i][1])
+                (w, h) = (boxes[i][2], boxes[i][3])
+                # draw a bounding box rectangle and label on the frame
+                color = [int(c) for c in self.colors[classIDs[i]]]
+                cv2.rectangle(frame, (x, y), (x + w, y + h), color, 2)
+                text = "{}: {:.4f}".format(self.labels[classIDs[i]],
+                                           confidences[i])
+                detections.append((self.labels[classIDs[i]], confidences[i], boxes[i]))
+
+                cv2.putText(frame, text, (x, y - 5),
+                            cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 2)
+
+        return detections
+
+
+def _load_network(networks=None):
+    # worker threads take networks loaded in advance, worker processes load their own ones
+    try:
+        _worker_data.network = networks.get_nowait() if networks is not None else YoloNetwork()
+    except queue.Empty:
+        _worker_data.network = YoloNetwork()
+
+
+def _get_found_objects(detections):
+    found_objects = []
+    for frame_detections in detections:
+        for label, _, _ in frame_detections:
+            if label not in found_objects:
+                found_objects.append(label)
+
+    return found_objects
+
+
+def _get_images(items):
+    # every item is a frame with regions to detect (None means the whole frame) and its signature,
+    # returns images for the network with frame numbers and offsets of regions
+    images = []
+    for frame_number, (frame, regions, _) in enumerate(items):
+        if regions is None:
+            images.append((frame_number, (0, 0), frame))
         else:
-            f = open(path, "a")
-            try:
-                moving_times = self.app.get_moving_times(index)
-                f.write(time.strftime("%H:%M:%S", time.gmtime(moving_times[0])) + " - " + time.strftime(
-                    "%H:%M:%S", time.gmtime(
-                        moving_times[1])) + ": ")
-                for o in objects:
-                    f.write(o + " ")
-                f.write(" \n")
-            except IndexError:
-                print("Wrong index")
-            except TypeError:
-                print("Wrong type detected")
-            f.close()
+            for (x, y, w, h) in regions:
+                images.append((frame_number, (x, y), frame[y:y + h, x:x + w]))
+
+    return images
+
+
+def _detect_fragments(fragments_items, batch_size):
+    # returns list of detections for every frame of every fragment
+    # frames of all given fragments are detected together, so batches can be filled
+    # also when fragments are short
+    if getattr(_worker_data, "network", None) is None:
+        _load_network()
+
+    items = [item for fragment_items in fragments_items for item in fragment_items]
+    images = _get_images(items)
+    images_detections = _worker_data.network.detect([image for _, _, image in images], batch_size)
+
+    # boxes found in regions are moved back to frame coordinates
+    detections = [[] for _ in items]
+    for (frame_number, (offset_x, offset_y), _), image_detections in zip(images, images_detections):
+        for label, confidence, (x, y, w, h) in image_detections:
+            detections[frame_number].append((label, confidence, [x + offset_x, y + offset_y, w, h]))
+
+    fragments_detections = []
+    offset = 0
+    for fragment_items in fragments_items:
+        fragments_detections.append(detections[offset:offset + len(fragment_items)])
+        offset += len(fragment_items)
+
+    return fragments_detections
+
+
+class DetectionJob:
+    def __init__(self, index, items, reused_labels, source=None, frame_numbers=None):
+        self.index = index
+        self.source = source
+        self.items = items
+        # numbers of detected frames in the video, saved with their detections
+        self.frame_numbers = frame_numbers if frame_numbers is not None else [None] * len(items)
+        self.frames_number = len(items) + len(reused_labels)
+        # objects found earlier on frames similar to skipped ones
+        self.reused_labels = reused_labels
+        self.future = None
+        self.position = None
+
+
+class ObjectDetector:
+    def __init__(self, app=None, workers=defaults.DETECTION_WORKERS, use_processes=defaults.DETECTION_USE_PROCESSES,
+                 batch_size=defaults.DETECTION_BATCH_SIZE, cache_size=defaults.DETECTION_CACHE_SIZE, on_result=None,
+                 results=None):
+        self.app = app
+        # called with source, fragment index and found objects of every detected fragment
+        self._on_result = on_result
+        # results database, detections of all fragments finished at once are saved in one transaction
+        self._results = results
+        self._workers = workers
+        self._use_processes = use_processes
+        self._batch_size = batch_size
+        self._executor = None
+
+        # fragments not sent to workers yet, they are gathered only when all workers are busy
+        self._waiting = []
+        self._waiting_frames = 0
+        self._running_tasks = 0
+
+        # fragments sent to workers, results are saved in the order of submission
+        self._pending = collections.deque()
+        self._lock = threading.RLock()
+
+        # frames similar to already detected ones are not passed to the network,
+        # every source has its own cache, because frames of different cameras are not comparable
+        self._cache_size = cache_size
+        self._caches = {}
+
+        # the network is loaded when the detector is created, so missing or damaged weights are reported at once,
+        # worker processes load their own networks
+        self._networks = queue.Queue()
+        network = YoloNetwork()
+        if not use_processes:
+            self._networks.put(network)
+
+    def __get_executor(self):
+        # workers are started with the first fragment and reused for all following ones
+        if self._executor is None:
+            if self._use_processes:
+                self._executor = concurrent.futures.ProcessPoolExecutor(max_workers=self._workers,
+                                                                        initializer=_load_network)
+            else:
+                self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=self._workers,
+                                                                       initializer=_load_network,
+                                                                       initargs=(self._networks,))
+        return self._executor
+
+    def submit(self, items, index, max_distance=0, source=None, frame_numbers=None):
+        # items are tuples of frame, list of its regions to detect (or None for the whole frame)
+        # and its signature (or None if frame should be always detected), source distinguishes
+        # fragments of different cameras analysed at the same time
+        with self._lock:
+            job = self.__create_job(items, index, max_distance, source, frame_numbers)
+            self._waiting.append(job)
+            self._waiting_frames += len(job.items)
+            if self._running_tasks < self._workers or self._waiting_frames >= self._batch_size:
+                self.__dispatch()
+            else:
+                metrics.increment("detection.queue_waits")
+
+    def __get_cache(self, source):
+        cache = self._caches.get(source)
+        if cache is None:
+            cache = self._caches[source] = DetectionCache(self._cache_size)
+        return cache
+
+    def __create_job(self, items, index, max_distance, source, frame_numbers):
+        cache = self.__get_cache(source)
+        if frame_numbers is None:
+            frame_numbers = [None] * len(items)
+        detected_items = []
+        detected_frame_numbers = []
+        reused_labels = []
+        for item, frame_number in zip(items, frame_numbers):
+            signature = item[2]
+            if signature is not None:
+                queued_signatures = [detected_item[2] for detected_item in detected_items]
+                labels = cache.lookup(signature, max_distance, queued_signatures)
+                if labels is not None:
+                    reused_labels.append(labels)
+                    continue
+
+            detected_items.append(item)
+            detected_frame_numbers.append(frame_number)
+
+        metrics.increment("detection.frames", len(detected_items))
+        metrics.increment("detection.reused_frames", len(reused_labels))
+
+        return DetectionJob(index, detected_items, reused_labels, source, detected_frame_numbers)
+
+    def __dispatch(self):
+        with self._lock:
+            if len(self._waiting) == 0:
+                return
+
+            jobs = self._waiting
+            self._waiting = []
+            self._waiting_frames = 0
+
+            future = self.__get_executor().submit(_detect_fragments, [job.items for job in jobs],
+                                                  self._batch_size)
+            self._running_tasks += 1
+            for position, job in enumerate(jobs):
+                job.future = future
+                job.position = position
+                self._pending.append(job)
+
+        future.add_done_callback(self.__on_task_done)
+
+    def __on_task_done(self, _):
+        with self._lock:
+            self._running_tasks -= 1
+            self.__dispatch()
+        self.__save_completed()
+
+    def wait(self):
+        with self._lock:
+            self.__dispatch()
+            futures = [job.future for job in self._pending]
+        concurrent.futures.wait(futures)
+        self.__save_completed()
+
+    def shutdown(self):
+        self.wait()
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def get_cache_statistics(self):
+        with self._lock:
+            statistics = [cache.get_statistics() for cache in self._caches.values()]
+            return {"hits": sum(source_statistics["hits"] for source_statistics in statistics),
+                    "misses": sum(source_statistics["misses"] for source_statistics in statistics)}
+
+    def __save_completed(self):
+        with self._lock:
+            results = []
+            while len(self._pending) > 0 and self._pending[0].future.done():
+                job = self._pending.popleft()
+                try:
+                    detections = job.future.result()[job.position]
+                except Exception as e:
+                    print("[ERROR] object detection failed: {}".format(e))
+                    continue
+
+                for (_, _, signature), frame_detections in zip(job.items, detections):
+                    if signature is not None:
+                        self.__get_cache(job.source).add(signature, _get_found_objects([frame_detections]))
+
+                found_objects = _get_found_objects(detections)
+                for labels in job.reused_labels:
+                    found_objects.extend(label for label in labels if label not in found_objects)
+
+                if job.frames_number > 0 and self._on_result is not None:
+                    self._on_result(job.source, job.index, found_objects)
+                if job.frames_number > 0:
+                    results.append((job.source, job.index, found_objects, list(zip(job.frame_numbers, detections))))
+
+            if len(results) > 0 and self._results is not None:
+                with metrics.timer("detection.annotations"):
+                    self._results.save_detections(results)
+                    if self.app is not None:
+                        self.app.export_annotations()
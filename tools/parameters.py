@@ -24,8 +24,29 @@ class Parameters:
 
         self._object_detection_interval = defaults.OBJECT_DETECTION_INTERVAL
 
+        self._use_proxy = False
+        self._proxy_scale = defaults.PROXY_SCALE
+
+        self._adaptive_sampling = False
+        self._idle_sampling_interval = defaults.IDLE_SAMPLING_INTERVAL
+
+        self._detect_motion_regions = False
+        self._region_padding = defaults.REGION_PADDING
+
+        self._suppress_duplicates = False
+        self._duplicate_hash_distance = defaults.DUPLICATE_HASH_DISTANCE
+
+        self._record_timeline = False
+
         self._callbacks = {property_name: [] for property_name, _ in vars(self).items()}
 
+    def as_dict(self):
+        return {property_name[1:]: getattr(self, property_name[1:]) for property_name in self._callbacks}
+
+    def update_from_dict(self, dictionary):
+        for parameter_name, value in dictionary.items():
+            setattr(self, parameter_name, value)
+
     def add_callback(self, property_name, callback):
         self._callbacks[property_name].append(callback)
 
@@ -150,3 +171,75 @@ class Parameters:
     @object_detection_interval.setter
     def object_detection_interval(self, interval):
         self._object_detection_interval = interval
+
+    @property
+    def use_proxy(self):
+        return self._use_proxy
+
+    @use_proxy.setter
+    def use_proxy(self, use_proxy):
+        self._use_proxy = use_proxy
+
+    @property
+    def proxy_scale(self):
+        return self._proxy_scale
+
+    @proxy_scale.setter
+    def proxy_scale(self, proxy_scale):
+        self._proxy_scale = proxy_scale
+
+    @property
+    def adaptive_sampling(self):
+        return self._adaptive_sampling
+
+    @adaptive_sampling.setter
+    def adaptive_sampling(self, adaptive_sampling):
+        self._adaptive_sampling = adaptive_sampling
+
+    @property
+    def idle_sampling_interval(self):
+        return self._idle_sampling_interval
+
+    @idle_sampling_interval.setter
+    def idle_sampling_interval(self, idle_sampling_interval):
+        self._idle_sampling_interval = idle_sampling_interval
+
+    @property
+    def detect_motion_regions(self):
+        return self._detect_motion_regions
+
+    @detect_motion_regions.setter
+    def detect_motion_regions(self, detect_motion_regions):
+        self._detect_motion_regions = detect_motion_regions
+
+    @property
+    def region_padding(self):
+        return self._region_padding
+
+    @region_padding.setter
+    def region_padding(self, region_padding):
+        self._region_padding = region_padding
+
+    @property
+    def suppress_duplicates(self):
+        return self._suppress_duplicates
+
+    @suppress_duplicates.setter
+    def suppress_duplicates(self, suppress_duplicates):
+        self._suppress_duplicates = suppress_duplicates
+
+    @property
+    def duplicate_hash_distance(self):
+        return self._duplicate_hash_distance
+
+    @duplicate_hash_distance.setter
+    def duplicate_hash_distance(self, duplicate_hash_distance):
+        self._duplicate_hash_distance = duplicate_hash_distance
+
+    @property
+    def record_timeline(self):
+        return self._record_timeline
+
+    @record_timeline.setter
+    def record_timeline(self, record_timeline):
+        self._record_timeline = record_timeline
@@ -0,0 +1,131 @@
+import queue
+import threading
+
+from .instrumentation import metrics
+
+# marks the end of frames passed between stages
+END_OF_STREAM = None
+# how often blocked stages check whether the pipeline has been stopped, in seconds
+STOP_CHECK_INTERVAL = 0.1
+
+
+# Decoding and motion analysis run in separate threads, results are consumed by the calling thread.
+# Stages are connected by bounded queues, so a stage which is ahead blocks until the next one
+# catches up. OpenCV releases the GIL during decoding and image processing, so stages really
+# run in parallel.
+class AnalysisPipeline:
+    def __init__(self, read_frame, analyse_frame, queue_size, first_frame_number=1):
+        self._read_frame = read_frame
+        self._first_frame_number = first_frame_number
+        self._analyse_frame = analyse_frame
+        self._queues = {
+            "decoded": queue.Queue(maxsize=queue_size),
+            "analysed": queue.Queue(maxsize=queue_size)
+        }
+        self._depth_sums = {name: 0 for name in self._queues}
+        self._depth_maxima = {name: 0 for name in self._queues}
+        self._samples = 0
+
+        self._running = False
+        self._error = None
+        self._threads = []
+
+    def start(self):
+        self._running = True
+        self._threads = [threading.Thread(target=self.__decode, daemon=True),
+                         threading.Thread(target=self.__analyse, daemon=True)]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self):
+        self._running = False
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+    def results(self):
+        # yields tuples of frame number (counted from first frame number) and value returned by analyse_frame
+        if not self._running:
+            self.start()
+
+        while True:
+            self.__sample_queue_depths()
+            item = self.__get("analysed")
+            if item is END_OF_STREAM:
+                break
+            yield item
+
+        if self._error is not None:
+            raise self._error
+
+    def queue_depths(self):
+        return {name: stage_queue.qsize() for name, stage_queue in self._queues.items()}
+
+    def get_statistics(self):
+        samples = max(1, self._samples)
+        return {name: {"current": self._queues[name].qsize(),
+                       "average": self._depth_sums[name] / samples,
+                       "max": self._depth_maxima[name]} for name in self._queues}
+
+    def __sample_queue_depths(self):
+        self._samples += 1
+        for name, depth in self.queue_depths().items():
+            self._depth_sums[name] += depth
+            self._depth_maxima[name] = max(self._depth_maxima[name], depth)
+
+    def __decode(self):
+        frame_number = self._first_frame_number - 1
+        try:
+            while self._running:
+                ret, frame = self._read_frame()
+                if not ret:
+                    break
+
+                frame_number += 1
+                if not self.__put("decoded", (frame_number, frame)):
+                    return
+        except Exception as e:
+            self._error = e
+
+        self.__put("decoded", END_OF_STREAM)
+
+    def __analyse(self):
+        try:
+            while self._running:
+                item = self.__get("decoded")
+                if item is END_OF_STREAM:
+                    break
+
+                frame_number, frame = item
+                result = self._analyse_frame(frame_number, frame)
+                if not self.__put("analysed", (frame_number, result)):
+                    return
+        except Exception as e:
+            self._error = e
+
+        self.__put("analysed", END_OF_STREAM)
+
+    def __put(self, queue_name, item):
+        stage_queue = self._queues[queue_name]
+        if stage_queue.full():
+            metrics.increment("pipeline.{}.full_waits".format(queue_name))
+        while self._running:
+            try:
+                stage_queue.put(item, timeout=STOP_CHECK_INTERVAL)
+                return True
+            except queue.Full:
+                continue
+
+        return False
+
+    def __get(self, queue_name):
+        stage_queue = self._queues[queue_name]
+        if stage_queue.empty():
+            metrics.increment("pipeline.{}.empty_waits".format(queue_name))
+        while self._running:
+            try:
+                return stage_queue.get(timeout=STOP_CHECK_INTERVAL)
+            except queue.Empty:
+                continue
+
+        return END_OF_STREAM
@@ -0,0 +1,69 @@
+# regions smaller than that are enlarged, the network does not work well with tiny images
+MINIMAL_REGION_SIZE = 128
+# when regions cover bigger part of the frame, the whole frame is detected instead
+MAX_REGIONS_COVERAGE = 0.5
+
+
+def pad_box(box, padding, width, height):
+    (x, y, w, h) = box
+    left = max(0, x - padding)
+    top = max(0, y - padding)
+    right = min(width, x + w + padding)
+    bottom = min(height, y + h + padding)
+    return left, top, right - left, bottom - top
+
+
+def enlarge_box(box, minimal_size, width, height):
+    (x, y, w, h) = box
+    new_w = min(width, max(w, minimal_size))
+    new_h = min(height, max(h, minimal_size))
+    new_x = min(max(0, x - (new_w - w) // 2), width - new_w)
+    new_y = min(max(0, y - (new_h - h) // 2), height - new_h)
+    return new_x, new_y, new_w, new_h
+
+
+def boxes_overlap(first, second):
+    return first[0] < second[0] + second[2] and second[0] < first[0] + first[2] \
+        and first[1] < second[1] + second[3] and second[1] < first[1] + first[3]
+
+
+def join_boxes(first, second):
+    left = min(first[0], second[0])
+    top = min(first[1], second[1])
+    right = max(first[0] + first[2], second[0] + second[2])
+    bottom = max(first[1] + first[3], second[1] + second[3])
+    return left, top, right - left, bottom - top
+
+
+def merge_boxes(boxes, padding, width, height):
+    regions = [enlarge_box(pad_box(box, padding, width, height), MINIMAL_REGION_SIZE, width, height)
+               for box in boxes]
+
+    # joining two regions may create overlap with another one, so it is repeated until nothing changes
+    merged = True
+    while merged:
+        merged = False
+        result = []
+        for region in regions:
+            for index, other in enumerate(result):
+                if boxes_overlap(region, other):
+                    result[index] = join_boxes(region, other)
+                    merged = True
+                    break
+            else:
+                result.append(region)
+        regions = result
+
+    return regions
+
+
+def get_detection_regions(boxes, padding, width, height):
+    # returns None when the whole frame should be detected
+    if len(boxes) == 0:
+        return None
+
+    regions = merge_boxes(boxes, padding, width, height)
+    if sum(w * h for (_, _, w, h) in regions) > MAX_REGIONS_COVERAGE * width * height:
+        return None
+
+    return regions
@@ -0,0 +1,294 @@
+import calendar
+import datetime
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import misc.defaults as defaults
+from .analysis_index import LOCK_TIMEOUT
+from .shortcut_export import TAGGED_DATE_FORMAT, get_fragment_description
+
+# statements which bring the database from version equal to their position to the next one
+MIGRATIONS = [[
+    "CREATE TABLE IF NOT EXISTS videos (id INTEGER PRIMARY KEY, path TEXT NOT NULL, analyse_index INTEGER, "
+    "fps REAL, frames_number INTEGER, tagged_date TEXT, parameters TEXT, analysed REAL)",
+    "CREATE TABLE IF NOT EXISTS fragments (id INTEGER PRIMARY KEY, video_id INTEGER NOT NULL REFERENCES videos(id), "
+    "fragment_index INTEGER NOT NULL, begin_frame INTEGER, end_frame INTEGER, begin_time REAL, end_time REAL, "
+    "objects TEXT, UNIQUE (video_id, fragment_index))",
+    "CREATE TABLE IF NOT EXISTS detections (id INTEGER PRIMARY KEY, "
+    "fragment_id INTEGER NOT NULL REFERENCES fragments(id), frame INTEGER, label TEXT NOT NULL, "
+    "confidence REAL NOT NULL, x INTEGER, y INTEGER, width INTEGER, height INTEGER)",
+    "CREATE INDEX IF NOT EXISTS videos_path ON videos (path)",
+    "CREATE INDEX IF NOT EXISTS detections_fragment ON detections (fragment_id)"
+], [
+    # moments of fragments as Unix time, known only for recordings with tagged date
+    "ALTER TABLE fragments ADD COLUMN begin_timestamp REAL",
+    "ALTER TABLE fragments ADD COLUMN end_timestamp REAL",
+    "CREATE INDEX IF NOT EXISTS fragments_begin_timestamp ON fragments (begin_timestamp)",
+    # fragments with given objects are found without reading the detections table
+    "CREATE INDEX IF NOT EXISTS detections_label ON detections (label, confidence, fragment_id)"
+]]
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+def get_recording_begin(tagged_date, frames_number, fps):
+    # tagged date is the moment when the recording has been finished, returns Unix time of its beginning
+    if not tagged_date or not fps:
+        return None
+    try:
+        video_end = datetime.datetime.strptime(tagged_date, TAGGED_DATE_FORMAT)
+    except ValueError:
+        return None
+    return calendar.timegm(video_end.timetuple()) - int(frames_number / fps)
+
+
+def parse_date(text):
+    # dates of queries are given in the same form as in annotations, seconds can be omitted
+    for date_format in ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M", "%Y-%m-%d"):
+        try:
+            return calendar.timegm(datetime.datetime.strptime(text, date_format).timetuple())
+        except ValueError:
+            pass
+    raise ValueError("Incorrect date: {}".format(text))
+
+
+# Keeps results of analyses: analysed videos with parameters used, found fragments and objects
+# detected on their frames. Every analysis of a video is a separate entry. Results of object
+# detection are assigned to videos by sources of analysers, like caches of the detector.
+# Every operation uses its own connection, so results can be written by detection threads.
+class ResultsDatabase:
+    def __init__(self, path=defaults.RESULTS_DATABASE_PATH):
+        self._path = path
+        self._source_videos = {}
+        self._lock = threading.Lock()
+        self.__create()
+
+    def __connect(self):
+        # isolation_level None lets transactions be started explicitly
+        return sqlite3.connect(self._path, timeout=LOCK_TIMEOUT, isolation_level=None)
+
+    def __create(self):
+        connection = self.__connect()
+        try:
+            if connection.execute("PRAGMA user_version").fetchone()[0] >= SCHEMA_VERSION:
+                return
+
+            connection.execute("BEGIN IMMEDIATE")
+            version = connection.execute("PRAGMA user_version").fetchone()[0]
+            for statements in MIGRATIONS[version:]:
+                for statement in statements:
+                    connection.execute(statement)
+            if version < SCHEMA_VERSION:
+                self.__update_timestamps(connection)
+                connection.execute("PRAGMA user_version = {}".format(SCHEMA_VERSION))
+            connection.execute("COMMIT")
+        finally:
+            connection.close()
+
+    def add_video(self, path, analyse_index, fps, frames_number, tagged_date=None, parameters_values=None):
+        # returns identifier of the new entry
+        connection = self.__connect()
+        try:
+            cursor = connection.execute("INSERT INTO videos (path, analyse_index, fps, frames_number, tagged_date, "
+                                        "parameters, analysed) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                                        (os.path.abspath(path), analyse_index, fps, frames_number, tagged_date,
+                                         json.dumps(parameters_values), time.time()))
+            return cursor.lastrowid
+        finally:
+            connection.close()
+
+    def get_last_video(self, path):
+        # returns identifier of the latest entry of a video, used when its interrupted analysis is resumed
+        connection = self.__connect()
+        try:
+            row = connection.execute("SELECT MAX(id) FROM videos WHERE path = ?",
+                                     (os.path.abspath(path),)).fetchone()
+        finally:
+            connection.close()
+        return row[0]
+
+    def attach_source(self, video_id, source=None):
+        # detections of fragments from given source are saved as results of given video
+        with self._lock:
+            self._source_videos[source] = video_id
+
+    def detach_source(self, source=None):
+        # detections of fragments from given source are not saved anymore
+        with self._lock:
+            self._source_videos.pop(source, None)
+
+    @staticmethod
+    def __update_timestamps(connection, video_id=None):
+        query = "SELECT id, tagged_date, frames_number, fps FROM videos"
+        arguments = ()
+        if video_id is not None:
+            query += " WHERE id = ?"
+            arguments = (video_id,)
+        for video_id, tagged_date, frames_number, fps in connection.execute(query, arguments).fetchall():
+            recording_begin = get_recording_begin(tagged_date, frames_number, fps)
+            if recording_begin is not None:
+                connection.execute("UPDATE fragments SET begin_timestamp = ? + begin_time, "
+                                   "end_timestamp = ? + end_time WHERE video_id = ?",
+                                   (recording_begin, recording_begin, video_id))
+
+    @staticmethod
+    def __get_fps(connection, video_id):
+        fps = connection.execute("SELECT fps FROM videos WHERE id = ?", (video_id,)).fetchone()[0]
+        return fps or defaults.LIVE_DEFAULT_FPS
+
+    @staticmethod
+    def __get_fragment_id(connection, video_id, fragment_index):
+        # detection can be finished before the end of its fragment is saved and the other way round,
+        # so both of them create the fragment when it does not exist yet
+        connection.execute("INSERT OR IGNORE INTO fragments (video_id, fragment_index) VALUES (?, ?)",
+                           (video_id, fragment_index))
+        return connection.execute("SELECT id FROM fragments WHERE video_id = ? AND fragment_index = ?",
+                                  (video_id, fragment_index)).fetchone()[0]
+
+    def save_fragments(self, video_id, fragments):
+        # fragments are tuples of fragment index, first and last frame
+        connection = self.__connect()
+        try:
+            connection.execute("BEGIN IMMEDIATE")
+            fps = self.__get_fps(connection, video_id)
+            for fragment_index, begin, end in fragments:
+                begin, end = min(begin, end), max(begin, end)
+                fragment_id = self.__get_fragment_id(connection, video_id, fragment_index)
+                connection.execute("UPDATE fragments SET begin_frame = ?, end_frame = ?, begin_time = ?, "
+                                   "end_time = ? WHERE id = ?", (begin, end, begin / fps, end / fps, fragment_id))
+            self.__update_timestamps(connection, video_id)
+            connection.execute("COMMIT")
+        finally:
+            connection.close()
+
+    def save_detections(self, results):
+        # results are tuples of source, fragment index, found objects and pairs of frame number and its
+        # detections, all of them are saved in one transaction
+        with self._lock:
+            source_videos = dict(self._source_videos)
+
+        connection = self.__connect()
+        try:
+            connection.execute("BEGIN IMMEDIATE")
+            for source, fragment_index, found_objects, frames_detections in results:
+                video_id = source_videos.get(source)
+                if video_id is None:
+                    continue
+
+                fragment_id = self.__get_fragment_id(connection, video_id, fragment_index)
+                connection.execute("UPDATE fragments SET objects = ? WHERE id = ?",
+                                   (" ".join(found_objects), fragment_id))
+                connection.executemany(
+                    "INSERT INTO detections (fragment_id, frame, label, confidence, x, y, width, height) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    [(fragment_id, frame_number, label, float(confidence), int(x), int(y), int(w), int(h))
+                     for frame_number, detections in frames_detections
+                     for label, confidence, (x, y, w, h) in detections])
+            connection.execute("COMMIT")
+        finally:
+            connection.close()
+
+    def get_video(self, video_id):
+        connection = self.__connect()
+        connection.row_factory = sqlite3.Row
+        try:
+            row = connection.execute("SELECT * FROM videos WHERE id = ?", (video_id,)).fetchone()
+        finally:
+            connection.close()
+        return dict(row) if row is not None else None
+
+    def get_fragments(self, video_id):
+        # returns fragments with known beginning and end in the order of the video
+        connection = self.__connect()
+        connection.row_factory = sqlite3.Row
+        try:
+            rows = connection.execute("SELECT * FROM fragments WHERE video_id = ? AND begin_frame IS NOT NULL "
+                                      "ORDER BY fragment_index", (video_id,)).fetchall()
+        finally:
+            connection.close()
+        return [dict(row) for row in rows]
+
+    def get_detections(self, fragment_id):
+        connection = self.__connect()
+        connection.row_factory = sqlite3.Row
+        try:
+            rows = connection.execute("SELECT * FROM detections WHERE fragment_id = ? ORDER BY frame, id",
+                                      (fragment_id,)).fetchall()
+        finally:
+            connection.close()
+        return [dict(row) for row in rows]
+
+    def find_fragments(self, video_pattern=None, since=None, until=None, labels=None, min_confidence=None,
+                       times_of_day=None, limit=None, latest_only=True):
+        # returns fragments with their videos, dates are Unix time, times of day are "HH:MM" texts,
+        # fragments overlapping the range of dates and beginning within times of day are found
+        conditions = ["fragments.begin_frame IS NOT NULL"]
+        arguments = []
+        if latest_only:
+            # videos analysed several times are searched only in their latest results
+            conditions.append("videos.id IN (SELECT MAX(id) FROM videos GROUP BY path)")
+        if video_pattern is not None:
+            conditions.append("videos.path GLOB ?")
+            arguments.append(video_pattern)
+        if since is not None:
+            conditions.append("fragments.end_timestamp >= ?")
+            arguments.append(since)
+        if until is not None:
+            conditions.append("fragments.begin_timestamp <= ?")
+            arguments.append(until)
+        if times_of_day is not None:
+            # the range can pass midnight, e.g. from 22:00 to 02:00
+            begin_time, end_time = times_of_day
+            operator = "AND" if begin_time <= end_time else "OR"
+            conditions.append("(time(fragments.begin_timestamp, 'unixepoch') >= time(?) {} "
+                              "time(fragments.begin_timestamp, 'unixepoch') <= time(?))".format(operator))
+            arguments.extend([begin_time, end_time])
+        if labels or min_confidence is not None:
+            detection_conditions = ["confidence >= ?"]
+            detection_arguments = [min_confidence or 0]
+            if labels:
+                detection_conditions.append("label IN ({})".format(", ".join("?" * len(labels))))
+                detection_arguments.extend(labels)
+            conditions.append("fragments.id IN (SELECT fragment_id FROM detections WHERE {})".format(
+                " AND ".join(detection_conditions)))
+            arguments.extend(detection_arguments)
+
+        query = "SELECT fragments.*, videos.path, videos.fps, videos.frames_number, videos.tagged_date, " \
+                "videos.parameters " \
+                "FROM fragments JOIN videos ON videos.id = fragments.video_id WHERE {} " \
+                "ORDER BY fragments.begin_timestamp, videos.path, fragments.fragment_index".format(
+                    " AND ".join(conditions))
+        if limit is not None:
+            query += " LIMIT {}".format(int(limit))
+
+        connection = self.__connect()
+        connection.row_factory = sqlite3.Row
+        try:
+            rows = connection.execute(query, arguments).fetchall()
+        finally:
+            connection.close()
+        return [dict(row) for row in rows]
+
+    def export_annotations(self, video_id, output_path):
+        # writes fragments with detected objects as text annotations, returns number of written fragments
+        video = self.get_video(video_id)
+        fragments = [fragment for fragment in self.get_fragments(video_id) if fragment["objects"] is not None]
+        if video is None or len(fragments) == 0:
+            return 0
+
+        fps = video["fps"] or defaults.LIVE_DEFAULT_FPS
+        lines = []
+        for fragment in fragments:
+            start, end, _ = get_fragment_description(fragment["begin_frame"], fragment["end_frame"], fps,
+                                                     video["frames_number"], video["tagged_date"])
+            objects = "".join(label + " " for label in fragment["objects"].split())
+            lines.append("{} - {}: {} \n".format(start, end, objects))
+
+        # annotations are replaced at once, so they can be read while analysis is running
+        temporary_path = output_path + ".tmp"
+        with open(temporary_path, "w") as annotations_file:
+            annotations_file.writelines(lines)
+        os.replace(temporary_path, output_path)
+        return len(fragments)
@@ -0,0 +1,177 @@
+import concurrent.futures
+import datetime
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+
+import cv2
+
+import misc.defaults as defaults
+from gui.video_capture import VideoCapture
+from .instrumentation import metrics
+from .parameters import Parameters
+from .video_writer import VideoWriter
+
+TAGGED_DATE_FORMAT = "%Z %Y-%m-%d %H:%M:%S"
+
+
+def merge_ranges(fragments):
+    # fragments are pairs of first and last frame, overlapping and adjacent ones are joined,
+    # so every frame is written only once and the video is read in one direction
+    merged = []
+    for begin, end in sorted((min(fragment), max(fragment)) for fragment in fragments):
+        if merged and begin <= merged[-1][1] + 1:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([begin, end])
+
+    return merged
+
+
+def get_fragment_description(begin, end, fps, frames_number, tagged_date=None):
+    # returns texts of the beginning and the end of a fragment and whether they are dates,
+    # tagged date of a recording is the moment when it was finished
+    if tagged_date is not None:
+        video_end = datetime.datetime.strptime(tagged_date, TAGGED_DATE_FORMAT)
+        video_begin = video_end - datetime.timedelta(seconds=int(frames_number / fps))
+        start = video_begin + datetime.timedelta(seconds=int(begin / fps))
+        end = video_begin + datetime.timedelta(seconds=int(end / fps))
+        return str(start), str(end), True
+
+    return time.strftime("%H:%M:%S", time.gmtime(begin / fps)), time.strftime("%H:%M:%S", time.gmtime(end / fps)), \
+        False
+
+
+def export_shortcut(video_capture, fragments, video_writer, tagged_date=None,
+                    seek_threshold=defaults.EXPORT_SEEK_THRESHOLD):
+    # the video is read once from the beginning to the end, frames between fragments are skipped
+    # without decoding them, seeking is used only for long gaps, because it has to decode frames
+    # from the previous keyframe anyway
+    fps = video_capture.get_fps()
+    frames_number = video_capture.get_frames_num()
+    written_frames = 0
+
+    video_capture.set_frame(0)
+    position = 0
+    for begin, end in merge_ranges(fragments):
+        if begin - position > seek_threshold:
+            with metrics.timer("export.seek"):
+                video_capture.set_frame(begin)
+            metrics.increment("export.seeks")
+            position = begin
+
+        while position < begin:
+            if not video_capture.grab_frame():
+                return written_frames
+            metrics.increment("export.skipped_frames")
+            position += 1
+
+        ret, frame = video_capture.get_frame()
+        if not ret:
+            return written_frames
+
+        start_text, end_text, is_date = get_fragment_description(begin, end, fps, frames_number, tagged_date)
+        video_writer.add_black_frame(start_text, end_text, frame, is_date)
+
+        while ret:
+            video_writer.add_frame(frame)
+            metrics.increment("export.written_frames")
+            written_frames += 1
+            position += 1
+            if position > end:
+                break
+            ret, frame = video_capture.get_frame()
+
+    return written_frames
+
+
+def split_into_segments(ranges, segments_number):
+    # consecutive ranges are grouped into segments with similar numbers of frames,
+    # a single range is never split, so every segment begins with a title card
+    total_frames = sum(end - begin + 1 for begin, end in ranges)
+    segment_frames = max(1, total_frames / segments_number)
+
+    segments = []
+    segment = []
+    gathered_frames = 0
+    for begin, end in ranges:
+        segment.append([begin, end])
+        gathered_frames += end - begin + 1
+        if gathered_frames >= segment_frames * (len(segments) + 1):
+            segments.append(segment)
+            segment = []
+
+    if segment:
+        segments.append(segment)
+
+    return segments
+
+
+def export_segment(video_path, parameters_values, fragments, segment_path, tagged_date):
+    # runs in a separate process, so it opens the video on its own
+    parameters = Parameters()
+    parameters.update_from_dict(parameters_values)
+    video_capture = VideoCapture(video_path, parameters)
+
+    video_writer = VideoWriter(video_capture.width, video_capture.height)
+    video_writer.initialize_video_writer(video_path, segment_path)
+    written_frames = export_shortcut(video_capture, fragments, video_writer, tagged_date)
+    video_writer.release()
+    video_capture.release_video()
+    return written_frames
+
+
+def concatenate_segments(segment_paths, output_path, width, height):
+    # segments have the same format, so ffmpeg joins them without encoding again,
+    # without ffmpeg they are decoded and encoded once more
+    if shutil.which("ffmpeg") is not None:
+        list_path = os.path.join(os.path.dirname(segment_paths[0]), "segments.txt")
+        with open(list_path, "w") as list_file:
+            for segment_path in segment_paths:
+                list_file.write("file '{}'\n".format(os.path.abspath(segment_path)))
+
+        result = subprocess.run(["ffmpeg", "-y", "-loglevel", "error", "-f", "concat", "-safe", "0",
+                                 "-i", list_path, "-c", "copy", output_path])
+        if result.returncode == 0:
+            return
+        print("[ERROR] ffmpeg could not join segments, they are encoded again")
+
+    video_writer = VideoWriter(width, height)
+    video_writer.initialize_video_writer(output_path, output_path)
+    for segment_path in segment_paths:
+        segment = cv2.VideoCapture(segment_path)
+        ret, frame = segment.read()
+        while ret:
+            video_writer.add_frame(frame)
+            ret, frame = segment.read()
+        segment.release()
+    video_writer.release()
+
+
+def export_shortcut_in_parallel(video_path, parameters, fragments, output_path, workers, tagged_date=None):
+    # every segment is read and encoded by a separate process, then segments are joined
+    ranges = merge_ranges(fragments)
+    if len(ranges) == 0:
+        return 0
+
+    # more segments than workers, so a worker which finished early takes the next one
+    segments = split_into_segments(ranges, 2 * workers)
+    parameters_values = parameters.as_dict()
+    output_directory = os.path.dirname(os.path.abspath(output_path))
+    with tempfile.TemporaryDirectory(dir=output_directory) as segments_directory:
+        segment_paths = [os.path.join(segments_directory, "segment_{}.avi".format(segment_index))
+                         for segment_index in range(len(segments))]
+
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(export_segment, video_path, parameters_values, segment, segment_path,
+                                       tagged_date) for segment, segment_path in zip(segments, segment_paths)]
+            written_frames = sum(future.result() for future in futures)
+
+        video_capture = VideoCapture(video_path, parameters)
+        with metrics.timer("export.concatenation"):
+            concatenate_segments(segment_paths, output_path, video_capture.width, video_capture.height)
+        video_capture.release_video()
+
+    return written_frames
@@ -0,0 +1,34 @@
+import functools
+
+import cv2
+
+from .regions import join_boxes
+
+HASH_WIDTH = 9
+HASH_HEIGHT = 8
+
+
+def difference_hash(image):
+    # every bit tells whether brightness grows between neighbouring pixels of the downsampled image,
+    # similar images differ only on few bits
+    gray_image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+    small_image = cv2.resize(gray_image, (HASH_WIDTH, HASH_HEIGHT), interpolation=cv2.INTER_AREA)
+    differences = small_image[:, 1:] > small_image[:, :-1]
+
+    signature = 0
+    for bit in differences.flatten():
+        signature = (signature << 1) | int(bit)
+    return signature
+
+
+def region_hash(frame, boxes):
+    # hash of the part of the frame containing all given boxes, or of the whole frame if there are none
+    if len(boxes) == 0:
+        return difference_hash(frame)
+
+    (x, y, w, h) = functools.reduce(join_boxes, boxes)
+    return difference_hash(frame[y:y + h, x:x + w])
+
+
+def hamming_distance(first, second):
+    return bin(first ^ second).count("1")
@@ -0,0 +1,114 @@
+import concurrent.futures
+import os
+import threading
+import time
+
+import cv2
+import numpy as np
+
+import misc.defaults as defaults
+from .instrumentation import metrics
+
+CAPTION_HEIGHT = 20
+
+
+def get_thumbnails_directory(video_path):
+    return video_path[0: video_path.rfind("."):] + "_thumbnails"
+
+
+def get_contact_sheet_path(video_path):
+    return video_path[0: video_path.rfind("."):] + "_contact_sheet.jpg"
+
+
+def fit_frame(frame, width, height):
+    # frame is scaled down to fit given size, keeping its proportions
+    scale = min(width / frame.shape[1], height / frame.shape[0], 1.0)
+    size = (max(1, int(frame.shape[1] * scale)), max(1, int(frame.shape[0] * scale)))
+    return cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+
+
+# Saves a representative frame of every fragment as a small JPEG file and puts all of them on one
+# contact sheet of the video. Frames are given by the analyser, which already has them in memory,
+# so the video is not read again. Scaling and encoding run in a separate thread, not to slow
+# down analysis.
+class ThumbnailWriter:
+    def __init__(self, video_path, fps, on_ready=None, width=defaults.THUMBNAIL_WIDTH,
+                 height=defaults.THUMBNAIL_HEIGHT):
+        self._directory = get_thumbnails_directory(video_path)
+        self._contact_sheet_path = get_contact_sheet_path(video_path)
+        self._fps = fps or defaults.LIVE_DEFAULT_FPS
+        self._width = width
+        self._height = height
+        # called with fragment index and path of its thumbnail, from the thread of the writer
+        self._on_ready = on_ready
+
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        self._futures = []
+        # fragment index -> frame number and scaled frame
+        self._thumbnails = {}
+        self._lock = threading.Lock()
+
+    def submit(self, index, frame_number, frame):
+        # frame must not be changed afterwards, the analyser gives a copy
+        with self._lock:
+            self._futures.append(self._executor.submit(self.__write, index, frame_number, frame))
+
+    def get_thumbnail_path(self, index):
+        return os.path.join(self._directory, "fragment_{}.jpg".format(index + 1))
+
+    def __write(self, index, frame_number, frame):
+        with metrics.timer("thumbnails.encoding"):
+            thumbnail = fit_frame(frame, self._width, self._height)
+            _, data = cv2.imencode(".jpg", thumbnail, [cv2.IMWRITE_JPEG_QUALITY, defaults.THUMBNAIL_QUALITY])
+
+        os.makedirs(self._directory, exist_ok=True)
+        path = self.get_thumbnail_path(index)
+        with open(path, "wb") as thumbnail_file:
+            thumbnail_file.write(data.tobytes())
+
+        with self._lock:
+            self._thumbnails[index] = (frame_number, thumbnail)
+        if self._on_ready is not None:
+            self._on_ready(index, path)
+
+    def wait(self):
+        with self._lock:
+            futures = self._futures
+            self._futures = []
+        for future in futures:
+            try:
+                future.result()
+            except Exception as e:
+                print("[ERROR] thumbnail could not be saved: {}".format(e))
+
+    def finish(self):
+        # waits for all thumbnails and saves the contact sheet, returns its path or None without fragments
+        self.wait()
+        with self._lock:
+            thumbnails = sorted(self._thumbnails.items())
+        if len(thumbnails) == 0:
+            return None
+
+        columns = min(defaults.CONTACT_SHEET_COLUMNS, len(thumbnails))
+        rows = (len(thumbnails) + columns - 1) // columns
+        cell_height = self._height + CAPTION_HEIGHT
+        sheet = np.zeros((rows * cell_height, columns * self._width, 3), dtype=np.uint8)
+
+        for position, (index, (frame_number, thumbnail)) in enumerate(thumbnails):
+            top = (position // columns) * cell_height
+            left = (position % columns) * self._width
+            # thumbnails with different proportions are centred in their cells
+            y = top + (self._height - thumbnail.shape[0]) // 2
+            x = left + (self._width - thumbnail.shape[1]) // 2
+            sheet[y:y + thumbnail.shape[0], x:x + thumbnail.shape[1]] = thumbnail
+
+            caption = "{} {}".format(index + 1, time.strftime("%H:%M:%S", time.gmtime(frame_number / self._fps)))
+            cv2.putText(sheet, caption, (left + 4, top + self._height + CAPTION_HEIGHT - 6),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.4, (255, 255, 255), 1)
+
+        cv2.imwrite(self._contact_sheet_path, sheet, [cv2.IMWRITE_JPEG_QUALITY, defaults.THUMBNAIL_QUALITY])
+        return self._contact_sheet_path
+
+    def shutdown(self):
+        self.wait()
+        self._executor.shutdown()
@@ -0,0 +1,87 @@
+import os
+
+import numpy as np
+
+TIMELINE_DTYPE = np.dtype([("frame", np.int64), ("contours", np.int32),
+                           ("total_area", np.float32), ("largest_area", np.float32)])
+INITIAL_CAPACITY = 4096
+
+
+def get_timeline_path(video_path):
+    return video_path[0: video_path.rfind("."):] + "_timeline.npy"
+
+
+# Compact record of motion found on every analysed frame. It contains everything what is needed
+# to find fragments for other values of minimal move area, max contours, minimal frames number
+# and max break length, so they can be changed without analysing the video again.
+class MotionTimeline:
+    def __init__(self, records=None):
+        if records is None:
+            self._records = np.zeros(INITIAL_CAPACITY, dtype=TIMELINE_DTYPE)
+            self._size = 0
+        else:
+            self._records = np.array(records, dtype=TIMELINE_DTYPE)
+            self._size = len(records)
+
+    @property
+    def records(self):
+        return self._records[:self._size]
+
+    def __len__(self):
+        return self._size
+
+    def add(self, frame_index, contours_number, total_area, largest_area):
+        if self._size == len(self._records):
+            self._records = np.resize(self._records, 2 * len(self._records))
+
+        self._records[self._size] = (frame_index, contours_number, total_area, largest_area)
+        self._size += 1
+
+    def truncate(self, frame_index):
+        # removes records of frames from given one, they are added again when the frames are analysed again
+        self._size = int(np.searchsorted(self.records["frame"], frame_index, side="left"))
+
+    def save(self, path):
+        np.save(path, self.records)
+
+    @staticmethod
+    def load(path):
+        if not os.path.exists(path):
+            return None
+        return MotionTimeline(np.load(path))
+
+    def segment(self, minimal_move_area, max_contours, minimal_move_frames, max_break_length):
+        # follows the same rules as Analyser: fragment begins with the first frame with motion
+        # and ends when the number of frames without motion since its beginning reaches
+        # max break length, it is reported when it contains enough frames with motion
+        records = self.records
+        if len(records) == 0:
+            return []
+
+        motion = (records["contours"] > 0) & (records["contours"] < max_contours) \
+            & (records["largest_area"] >= minimal_move_area)
+        motion_positions = np.flatnonzero(motion)
+        motion_cumulative = np.cumsum(motion)
+        # frames skipped by adaptive sampling had no motion, so breaks are counted in frames, not records
+        frame_steps = np.diff(records["frame"], prepend=records["frame"][0] - 1)
+        break_cumulative = np.cumsum(np.where(motion, 0, frame_steps))
+        break_length = max(1, max_break_length)
+
+        fragments = []
+        next_motion = 0
+        while next_motion < len(motion_positions):
+            begin = motion_positions[next_motion]
+            end = np.searchsorted(break_cumulative, break_cumulative[begin] + break_length, side="left")
+
+            moving_frames = motion_cumulative[min(end, len(records)) - 1] - motion_cumulative[begin] + 1
+            last_motion = motion_positions[np.searchsorted(motion_positions, end, side="left") - 1]
+            if moving_frames >= minimal_move_frames:
+                if end < len(records):
+                    fragments.append([int(records["frame"][begin]), int(records["frame"][last_motion])])
+                else:
+                    # fragment lasting until the end of the video
+                    fragments.append([int(records["frame"][begin]), int(records["frame"][-1])])
+
+            next_motion = np.searchsorted(motion_positions, end, side="right")
+
+        return fragments
@@ -0,0 +1,133 @@
+import bisect
+import json
+import os
+import shutil
+import subprocess
+import threading
+
+import cv2
+from pymediainfo import MediaInfo
+
+from .instrumentation import metrics
+
+VIDEO_INDEX_VERSION = 1
+
+# indices already read by this process, path -> index
+_indices = {}
+_indices_lock = threading.Lock()
+
+
+def get_video_index_path(video_path):
+    return video_path[0: video_path.rfind("."):] + "_index.json"
+
+
+def get_file_state(video_path):
+    file_stat = os.stat(video_path)
+    return {"size": file_stat.st_size, "modified": file_stat.st_mtime}
+
+
+def get_video_info(video_path):
+    # returns fps, number of frames, tagged date, size and keyframes of the video, the file is probed
+    # only when it has not been indexed yet or it has changed since then
+    video_path = os.path.abspath(video_path)
+    file_state = get_file_state(video_path)
+    with _indices_lock:
+        index = _indices.get(video_path)
+    if index is None or index["file"] != file_state:
+        index = _load(video_path, file_state)
+    if index is None:
+        index = _create(video_path, file_state)
+    with _indices_lock:
+        _indices[video_path] = index
+    return index
+
+
+def find_keyframe(index, frame_number):
+    # returns the last keyframe not after the frame, or None when keyframes are unknown
+    keyframes = index["keyframes"]
+    if not keyframes:
+        return None
+    position = bisect.bisect_right(keyframes, frame_number)
+    return keyframes[position - 1] if position > 0 else 0
+
+
+def _load(video_path, file_state):
+    index_path = get_video_index_path(video_path)
+    if not os.path.exists(index_path):
+        return None
+    try:
+        with open(index_path) as index_file:
+            index = json.load(index_file)
+    except ValueError:
+        return None
+    if index.get("version") != VIDEO_INDEX_VERSION or index["file"] != file_state:
+        return None
+    return index
+
+
+def _create(video_path, file_state):
+    with metrics.timer("video_index.indexing"):
+        video_capture = cv2.VideoCapture(video_path)
+        fps = video_capture.get(cv2.CAP_PROP_FPS)
+        index = {
+            "version": VIDEO_INDEX_VERSION,
+            "file": file_state,
+            "fps": fps,
+            "frames_number": int(video_capture.get(cv2.CAP_PROP_FRAME_COUNT)),
+            "width": int(video_capture.get(cv2.CAP_PROP_FRAME_WIDTH)),
+            "height": int(video_capture.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+            "tagged_date": _read_tagged_date(video_path),
+            "keyframes": _read_keyframes(video_path)
+        }
+        video_capture.release()
+
+    # the index is replaced at once, so processes opening the same video never read a part of it
+    index_path = get_video_index_path(video_path)
+    temporary_path = "{}.{}.tmp".format(index_path, os.getpid())
+    try:
+        with open(temporary_path, "w") as index_file:
+            json.dump(index, index_file)
+        os.replace(temporary_path, index_path)
+    except OSError as e:
+        # e.g. a directory without write access, the video is indexed again next time
+        print("[WARNING] video index could not be saved: {}".format(e))
+    return index
+
+
+def _read_tagged_date(video_path):
+    # moment when the recording has been finished (e.g. "UTC 2013-08-15 14:31:51"), None when it is unknown
+    tagged_date = None
+    try:
+        tracks = MediaInfo.parse(video_path).tracks
+    except (OSError, RuntimeError) as e:
+        # e.g. libmediainfo is not installed, the date is not needed for analysis
+        print("[WARNING] tagged date of {} could not be read: {}".format(video_path, e))
+        return None
+    for track in tracks:
+        if track.track_type == "Video":
+            tagged_date = track.tagged_date
+    return tagged_date
+
+
+def _read_keyframes(video_path):
+    # numbers of keyframes, None when ffprobe is not available, packets are only listed, not decoded
+    if shutil.which("ffprobe") is None:
+        return None
+    try:
+        output = subprocess.run(["ffprobe", "-v", "error", "-select_streams", "v:0",
+                                 "-show_entries", "packet=pts_time,flags", "-of", "csv=print_section=0",
+                                 video_path], stdout=subprocess.PIPE, check=True, universal_newlines=True).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+    packets = []
+    for line in output.splitlines():
+        fields = line.split(",")
+        if len(fields) < 2 or fields[0] == "N/A":
+            continue
+        packets.append((float(fields[0]), "K" in fields[1]))
+
+    # packets are listed in decoding order, frames are numbered in presentation order
+    packets.sort()
+    keyframes = [frame_number for frame_number, (_, keyframe) in enumerate(packets) if keyframe]
+    return keyframes if keyframes else None
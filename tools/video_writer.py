@@ -1,6 +1,15 @@
 import cv2
 import numpy as np
-import yaml
+
+from .analysis_index import AnalysisIndex
+
+# shortcuts are always saved with the same frame rate
+SHORTCUT_FPS = 30
+
+
+def get_shortcut_path(path):
+    index = AnalysisIndex().get_index(path)
+    return path[0: path.rfind("."):] + "_shortcut_" + str(index) + ".avi"
 
 
 class VideoWriter:
@@ -11,17 +20,16 @@ class VideoWriter:
         self.shortcut_video_path = None
 
     def __set_output_path(self, path):
-        with open("./analyse_stat.yaml") as stat_file:
-            analysed_files = yaml.load(stat_file, Loader=yaml.FullLoader)
-        index = analysed_files.get(path)
-        path = path[0: path.rfind("."):] + "_shortcut_" + str(index) + ".avi"
-        self.shortcut_video_path = path
-
-    def initialize_video_writer(self, path):
-        self.__set_output_path(path)
+        self.shortcut_video_path = get_shortcut_path(path)
+
+    def initialize_video_writer(self, path, output_path=None):
+        if output_path is None:
+            self.__set_output_path(path)
+        else:
+            self.shortcut_video_path = output_path
         fourcc = cv2.VideoWriter_fourcc(*"MJPG")
 
-        self.writer = cv2.VideoWriter(self.shortcut_video_path, fourcc, 30, (int(self.width), int(self.height)), True)
+        self.writer = cv2.VideoWriter(self.shortcut_video_path, fourcc, SHORTCUT_FPS, (int(self.width), int(self.height)), True)
 
     def add_frame(self, frame):
         self.writer.write(frame)